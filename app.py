@@ -1,10 +1,24 @@
 import streamlit as st
 import pandas as pd
-import requests
-import json
-from datetime import datetime
-import re
+import os
+from datetime import datetime, timedelta
 from time import sleep
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+import geo
+import perf
+import preview
+import audit_log
+import workers
+import scheduler
+from core import (
+    ADS_COLUMNS, APP_TZ, WEBHOOK_URL, build_ads_payload, build_campaign_payload,
+    format_validation_error, from_ms, ids_as_text, is_blocking, iter_table_chunks, local_now, parse_links, send_to_webhook,
+    stream_ads_validation, validate_ads, validate_campaign, validate_media_links
+)
+from session_store import SessionStore
+from autosave import DraftStore
+from id_verification import IdVerifier
 
 # Set page config
 st.set_page_config(
@@ -71,75 +85,240 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Tables above this size are validated in chunks with a progress bar
+STREAMING_VALIDATION_ROWS = 5000
+VALIDATION_CHUNK_ROWS = 5000
+
+# Reruns scoped to one section where Streamlit supports them (st.fragment
+# from 1.37, st.experimental_fragment from 1.33); older versions run the
+# decorated function as part of the page
+fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda func: func)
+
 # Initialize session state variables if they don't exist
 if 'page' not in st.session_state:
     st.session_state.page = 'Create Ads'
 
-# Function to validate URL
-def is_valid_url(url):
-    if not url:
-        return False
-    url_pattern = re.compile(
-        r'^https?://'  # http:// or https://
-        r'(?:(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+[A-Z]{2,6}\.?|'  # domain...
-        r'localhost|'  # localhost...
-        r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})'  # ...or ip
-        r'(?::\d+)?'  # optional port
-        r'(?:/?|[/?]\S+)$', re.IGNORECASE)
-    return url_pattern.match(url) is not None
-
-def is_valid_driveurl(url):
-    if not url:
-        return False
-    url_pattern_drive = re.compile(
-        r'^https?://'  # http:// ou https://
-        r'(?:www\.)?'  # opcional www
-        r'drive\.google\.com'  # domínio fixo do Google Drive
-        r'(?:/[\w\-./?=&%]*)?$',  # caminhos e parâmetros permitidos
-        re.IGNORECASE
-    )
-    return url_pattern_drive.match(url)
-
-# Function to send data to webhook
-def send_to_webhook(data, endpoint_url):
-    try:
-        response = requests.post(
-            endpoint_url,
-            json=data,
-            headers={"Content-Type": "application/json"}
-        )
-        if response.status_code == 200:
-            return True, "Dados enviados com sucesso!"
+# Function to pick a selectbox index, falling back to the first option
+def option_index(options, value):
+    return options.index(value) if value in options else 0
+
+# Function to show how each typed targeting value was resolved
+def show_geo_resolution(results, complete=True):
+    for result in results:
+        if result.entry is not None:
+            st.caption(f"✅ {geo.describe(result.entry)}")
+        elif not complete:
+            # Partial list (bundled municipality sample): missing is not wrong
+            hint = f"; confira se não é {', '.join(geo.describe(entry) for entry in result.suggestions)}" if result.suggestions else ""
+            st.caption(f"⚠️ {result.text}: fora da lista local de municípios, não verificado{hint}")
+        elif result.suggestions:
+            st.caption(f"❓ {result.text}: você quis dizer {', '.join(geo.describe(entry) for entry in result.suggestions)}?")
         else:
-            return False, f"Erro: {response.status_code} - {response.text}"
-    except Exception as e:
-        return False, f"Erro: {str(e)}"
+            st.caption(f"❌ {result.text}: não encontrado")
+
+# Function to grow the JSON preview of a page on demand
+def expand_preview(key):
+    st.session_state[key] = min(st.session_state.get(key, preview.PREVIEW_ITEMS) * 4, preview.MAX_PREVIEW_ITEMS)
+
+# Function to render the payload preview: summary, diff against the last
+# submission of each account and a truncated JSON view. sample_of(n) returns
+# the payload with at most n rows, so nothing here grows with the batch.
+def render_payload_preview(summary, diffs, sample_of, key):
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Linhas", summary["linhas"])
+    col2.metric("Contas", summary["total_contas"])
+    col3.metric("Criativos distintos", summary["criativos"])
+    col4.metric("Tamanho estimado", f"{summary['bytes_estimados'] / 1024:.1f} KB")
+    
+    if summary["total_contas"] > 1:
+        st.dataframe(
+            pd.DataFrame(list(summary["contas"].items()), columns=["Conta", "Linhas"]),
+            use_container_width=True, hide_index=True
+        )
+        if summary["total_contas"] > len(summary["contas"]):
+            st.caption(f"… e mais {summary['total_contas'] - len(summary['contas'])} contas")
+    
+    for diff in diffs:
+        if diff["anterior_em"] is None:
+            st.caption(f"🆕 Conta {diff['conta']}: primeiro envio registrado")
+            continue
+        sent_at = from_ms(diff["anterior_em"]).strftime("%d/%m/%Y %H:%M")
+        lines = [f"🔁 Conta {diff['conta']} — comparado ao envio de {sent_at}: {diff['linhas_antes']} → {diff['linhas_agora']} linhas"]
+        if "novos" in diff:
+            lines.append(f"{diff['novos']} novos · {diff['alterados']} alterados · {diff['removidos']} ausentes")
+            for label, names in diff["exemplos"].items():
+                if names:
+                    lines.append(f"{label}: {', '.join(names)}")
+        for change in diff.get("campos_alterados", []):
+            lines.append(f"{change['campo']}: {change['antes']} → {change['depois']}")
+        if diff["midias_alteradas"]:
+            lines.append("links de mídia alterados")
+        st.markdown("  \n".join(lines))
+    
+    items = st.session_state.get(key, preview.PREVIEW_ITEMS)
+    st.json(preview.sample_view(sample_of(items), summary["linhas"], items), expanded=False)
+    if summary["linhas"] > items and items < preview.MAX_PREVIEW_ITEMS:
+        st.button("➕ Mostrar mais linhas", key=f"{key}_more", on_click=expand_preview, args=(key,))
+
+# Function for the "schedule instead of sending now" options of a page.
+# Returns None to send now, else {"inicio", "fim", "prioridade", "lotes"};
+# with batches the table is split and the batches spread from inicio to fim.
+def render_schedule_options(key, allow_batches=False):
+    if not st.toggle("⏰ Agendar envio", key=f"{key}_schedule_on"):
+        return None
+    default = (local_now() + timedelta(hours=1)).replace(minute=0, second=0, microsecond=0)
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        day = st.date_input("Data", value=default.date(), key=f"{key}_schedule_date")
+        at = st.time_input("Horário", value=default.time(), step=300, key=f"{key}_schedule_time")
+    with col2:
+        priority = st.selectbox("Prioridade", list(scheduler.PRIORITIES), key=f"{key}_schedule_priority",
+                                help="Entre envios do mesmo horário, os de prioridade alta saem primeiro.")
+    batches, spread_hours = 1, 0.0
+    if allow_batches:
+        with col3:
+            batches = st.number_input("Lotes", min_value=1, max_value=100, value=1, key=f"{key}_schedule_batches",
+                                      help="Divide a tabela em lotes enviados em horários diferentes.")
+            spread_hours = st.number_input("Distribuir ao longo de (horas)", min_value=0.0, max_value=24.0, value=0.0, step=0.5,
+                                           key=f"{key}_schedule_spread", disabled=batches == 1)
+    start = datetime.combine(day, at, tzinfo=APP_TZ)
+    if start < local_now():
+        st.caption("⚠️ Horário já passou: o envio sai na próxima verificação do agendador.")
+    return {
+        "inicio": start,
+        "fim": start + timedelta(hours=spread_hours) if batches > 1 and spread_hours else None,
+        "prioridade": scheduler.PRIORITIES[priority],
+        "lotes": int(batches),
+    }
+
+# Function to confirm a scheduled submission
+def show_scheduled(job_ids, schedule):
+    when = schedule["inicio"].strftime("%d/%m/%Y %H:%M")
+    if schedule["fim"] is not None:
+        when += f" a {schedule['fim'].strftime('%d/%m/%Y %H:%M')}"
+    st.markdown(f'<div class="success-message">⏰ {len(job_ids)} envio(s) agendado(s) para {when} (nº {", ".join(map(str, job_ids[:10]))}{"…" if len(job_ids) > 10 else ""}). Acompanhe na página Agendamentos.</div>', unsafe_allow_html=True)
+
+# Function to render a running validation summary as a structured error table
+def render_validation_summary(summary):
+    st.caption(f"{summary['linhas']} linhas verificadas · {summary['erros']} erros em {summary['linhas_com_erro']} linhas")
+    if summary["erros"]:
+        col1, col2 = st.columns([1, 3])
+        with col1:
+            st.dataframe(
+                pd.DataFrame(sorted(summary["por_campo"].items(), key=lambda item: -item[1]), columns=["Campo", "Erros"]),
+                use_container_width=True, hide_index=True
+            )
+        with col2:
+            st.dataframe(
+                pd.DataFrame(summary["amostra"][:200]).rename(columns={"linha": "Linha", "campo": "Campo", "erro": "Erro"})[["Linha", "Campo", "Erro"]],
+                use_container_width=True, hide_index=True
+            )
+
+# Function to validate ads chunk by chunk, updating a progress bar and the error summary
+def run_streaming_validation(chunks, label, progress_of, on_update=None):
+    progress_bar = st.progress(0.0, text=label)
+    summary_placeholder = st.empty()
+    summary = {"linhas": 0, "erros": 0, "bloqueantes": 0, "linhas_com_erro": 0, "por_campo": {}, "amostra": []}
+    for summary in stream_ads_validation(chunks):
+        if on_update:
+            on_update(summary)
+        progress_bar.progress(min(max(progress_of(summary["linhas"]), 0.0), 1.0), text=f"{label}: {summary['linhas']} linhas")
+        with summary_placeholder.container():
+            render_validation_summary(summary)
+    progress_bar.progress(1.0, text=f"{label}: {summary['linhas']} linhas")
+    return summary
+
+def cancel_upload_validation():
+    if st.session_state.get("upload_validation"):
+        st.session_state.upload_validation["status"] = "cancelled"
+
+# Function for the ads sheet upload with streaming validation
+def show_ads_upload_section():
+    with st.expander("📤 Importar planilha de anúncios (CSV / Parquet)"):
+        uploaded = st.file_uploader("Planilha de anúncios", type=["csv", "parquet"], label_visibility="collapsed", key="ads_upload")
+        if uploaded is None:
+            return
+        
+        file_format = "parquet" if uploaded.name.lower().endswith(".parquet") else "csv"
+        upload_key = f"{uploaded.name}:{uploaded.size}"
+        state = st.session_state.get("upload_validation")
+        if state is None or state["key"] != upload_key:
+            state = st.session_state.upload_validation = {"key": upload_key, "status": "pending", "summary": None}
+        elif state["status"] == "running":
+            # A rerun interrupted the previous validation
+            state["status"] = "cancelled"
+        
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            start = st.button("▶️ Validar arquivo", use_container_width=True)
+        with col2:
+            st.button("⏹️ Cancelar", use_container_width=True, on_click=cancel_upload_validation)
+        with col3:
+            load = st.button("📥 Carregar na tabela", use_container_width=True, disabled=state["status"] != "done")
+        
+        if start:
+            state["status"] = "running"
+            state["summary"] = None
+            uploaded.seek(0)
+            if file_format == "parquet":
+                import pyarrow.parquet as pq
+                total_rows = pq.ParquetFile(uploaded).metadata.num_rows or 1
+                uploaded.seek(0)
+                progress_of = lambda rows: rows / total_rows
+            else:
+                progress_of = lambda rows: uploaded.tell() / max(uploaded.size, 1)
+            
+            def keep_summary(summary):
+                state["summary"] = dict(summary)
+            
+            try:
+                run_streaming_validation(
+                    iter_table_chunks(uploaded, VALIDATION_CHUNK_ROWS, file_format),
+                    "Validando arquivo", progress_of, on_update=keep_summary
+                )
+            except Exception as e:
+                state["status"] = "error"
+                st.error(f"Não foi possível ler o arquivo: {e}")
+                return
+            state["status"] = "done"
+        elif state["summary"]:
+            if state["status"] == "cancelled":
+                st.warning(f"Validação cancelada após {state['summary']['linhas']} linhas.")
+            render_validation_summary(state["summary"])
+        
+        if load:
+            uploaded.seek(0)
+            chunks = [chunk.reindex(columns=ADS_COLUMNS) for chunk in iter_table_chunks(uploaded, VALIDATION_CHUNK_ROWS, file_format)]
+            st.session_state.ads_table = session_store.handle(session_id, "ads_df")
+            st.session_state.ads_table.save(pd.concat(chunks) if chunks else pd.DataFrame(columns=ADS_COLUMNS))
+            st.success(f"{state['summary']['linhas']} anúncios carregados na tabela.")
 
 # Function for Create Ads page
 def show_create_ads_page():
     st.markdown('<h1 class="main-header">🧩 Criar Anúncios</h1>', unsafe_allow_html=True)
     st.markdown('<p class="sub-header">Crie anúncios baseados em conjuntos de anúncios existentes</p>', unsafe_allow_html=True)
     
-    # Initialize session state for ads data if it doesn't exist
-    if 'ads_df' not in st.session_state:
-        st.session_state.ads_df = pd.DataFrame(columns=[
-            "ID Adset", "Nome Anúncio", "Tipo de Anúncio", "ID da Página do Facebook",
-            "Status do Anúncio", "Link de Destino", "Texto do Anúncio", 
-            "Call to Action (CTA)", "BM Conectada", "ID Conta de Anúncios"
-        ])
+    # Streaming import of large sheets
+    show_ads_upload_section()
+    
+    # The table itself lives in the session store; session_state keeps only a handle
+    empty_ads_df = pd.DataFrame(columns=ADS_COLUMNS)
+    if 'ads_table' not in st.session_state:
+        st.session_state.ads_table = session_store.handle(session_id, "ads_df", default=empty_ads_df)
+    ads_df = ids_as_text(st.session_state.ads_table.load(default=empty_ads_df))
     
     # Create the data editor
     edited_df = st.data_editor(
-        st.session_state.ads_df,
+        ads_df,
         column_config={
-            "ID Adset": st.column_config.NumberColumn("ID Adset", required=True),
+            "ID Adset": st.column_config.TextColumn("ID Adset", required=True),
             "Nome Anúncio": st.column_config.TextColumn("Nome Anúncio", required=True),
             "Tipo de Anúncio": st.column_config.SelectboxColumn(
                 "Tipo de Anúncio", 
                 options=["Image", "Video", "Carousel"], 
                 required=True
             ),
-            "ID da Página do Facebook": st.column_config.NumberColumn("ID da Página do Facebook", required=True),
+            "ID da Página do Facebook": st.column_config.TextColumn("ID da Página do Facebook", required=True),
             "Status do Anúncio": st.column_config.SelectboxColumn(
                 "Status do Anúncio", 
                 options=["ACTIVE", "PAUSED"], 
@@ -158,15 +337,18 @@ def show_create_ads_page():
                 options=["Piai & Associados", "V4 Ferraz & Co"], 
                 required=True
             ),
-            "ID Conta de Anúncios": st.column_config.NumberColumn("ID Conta de Anúncios", required=True)
+            "ID Conta de Anúncios": st.column_config.TextColumn("ID Conta de Anúncios", required=True)
         },
         num_rows="dynamic",
         use_container_width=True,
         hide_index=True
     )
     
-    # Update the session state with the edited DataFrame
-    st.session_state.ads_df = edited_df
+    # Update the session store with the edited DataFrame
+    st.session_state.ads_table.save(edited_df)
+    ads_df = edited_df
+    if operator:
+        drafts.schedule_table(operator, edited_df)
     
     # Upload sections
     col1, col2 = st.columns(2)
@@ -198,161 +380,217 @@ def show_create_ads_page():
         st.markdown('</div>', unsafe_allow_html=True)
     
     
-    validation_messages = []
-    
-    # Validate DataFrame
-    if not st.session_state.ads_df.empty:
-        for index, row in st.session_state.ads_df.iterrows():
-            # Check for missing required fields
-            for col in st.session_state.ads_df.columns:
-                if pd.isna(row[col]) or row[col] == "":
-                    validation_messages.append(f"❌ Linha {index+1}: {col} é obrigatório")
-            
-            # Validate destination link
-            if not pd.isna(row["Link de Destino"]) and row["Link de Destino"]:
-                if not is_valid_url(row["Link de Destino"]):
-                    validation_messages.append(f"❌ Linha {index+1}: Link de Destino deve ser uma URL válida")
-    
-    # Validate image links
-    if image_links:
-        for line_num, link in enumerate(image_links.strip().split('\n'), 1):
-            if link.strip() and not is_valid_driveurl(link.strip()):
-                validation_messages.append(f"❌ Link de Imagem linha {line_num}: URL inválida || Verifique se o link da imagem é de um drive")
-    
-    # Validate thumbnail link
-    if thumbnail_link and not is_valid_driveurl(thumbnail_link.strip()):
-        validation_messages.append("❌ Link de Thumbnail: URL inválida || Faça upload da Imagem no google Drive")
+    with perf.timed("validation", page="criar_anuncio"):
+        # Page, account and ad set ids: each distinct id is checked once and cached
+        id_errors = id_verifier.validate_frame(ads_df)
+        if len(ads_df) > STREAMING_VALIDATION_ROWS:
+            # Large tables are validated chunk by chunk with live progress
+            chunks = (ads_df.iloc[i:i + VALIDATION_CHUNK_ROWS] for i in range(0, len(ads_df), VALIDATION_CHUNK_ROWS))
+            summary = run_streaming_validation(chunks, "Validando tabela", lambda rows: rows / len(ads_df))
+            other_errors = validate_media_links(image_links, thumbnail_link) + id_errors
+            validation_messages = [format_validation_error(error) for error in summary["amostra"] + other_errors]
+            if summary["erros"] > len(summary["amostra"]):
+                validation_messages.append(f"… e mais {summary['erros'] - len(summary['amostra'])} erros")
+            show_messages = [format_validation_error(error) for error in other_errors[:200]]
+            has_blocking_errors = summary["bloqueantes"] > 0 or any(is_blocking(error) for error in other_errors)
+        else:
+            errors = validate_ads(ads_df, image_links, thumbnail_link) + id_errors
+            validation_messages = [format_validation_error(error) for error in errors]
+            show_messages = validation_messages
+            has_blocking_errors = any(is_blocking(error) for error in errors)
     
     if validation_messages:
-        for msg in validation_messages:
+        for msg in show_messages:
             st.markdown(msg)
     else:
         st.markdown("✅ Todos os campos estão válidos!")
     
     st.markdown('</div>', unsafe_allow_html=True)
     
+    # Preview of what will be sent
+    if not ads_df.empty and st.toggle("📋 Pré-visualizar envio", key="ads_preview_on"):
+        with perf.timed("preview", page="criar_anuncio"):
+            summary, diffs = preview.preview_ads(ads_df, parse_links(image_links) + [thumbnail_link.strip() if thumbnail_link else ""])
+            render_payload_preview(
+                summary, diffs,
+                lambda items: build_ads_payload(ads_df.head(items), image_links, thumbnail_link),
+                "ads_preview_items"
+            )
+    
     # Submit button
     st.divider()
+    schedule = render_schedule_options("ads", allow_batches=True)
     col1, col2, col3 = st.columns([2, 1, 2])
     with col2:
-        submit_button = st.button("🚀 Enviar Anúncios", type="primary", use_container_width=True)
+        submit_button = st.button("⏰ Agendar Anúncios" if schedule else "🚀 Enviar Anúncios", type="primary", use_container_width=True)
     
     # Process form submission
     if submit_button:
-        if st.session_state.ads_df.empty:
+        if ads_df.empty:
             st.error("Por favor, adicione pelo menos um anúncio antes de enviar.")
-        elif validation_messages:
+        elif has_blocking_errors:
             st.error("Por favor, corrija os erros de validação antes de enviar.")
+        elif schedule:
+            batches = min(schedule["lotes"], len(ads_df))
+            bounds = [len(ads_df) * i // batches for i in range(batches + 1)]
+            payloads = [build_ads_payload(ads_df.iloc[bounds[i]:bounds[i + 1]], image_links, thumbnail_link) for i in range(batches)]
+            job_ids = job_scheduler.schedule_spread(
+                payloads, schedule["inicio"], schedule["fim"], schedule["prioridade"], st.session_state.operator.strip()
+            )
+            show_scheduled(job_ids, schedule)
+            # Clear form once the batches are queued, as after a send
+            st.session_state.ads_table.save(pd.DataFrame(columns=ADS_COLUMNS))
+            sleep(5)
+            st.rerun()
         else:
-            # Prepare data for submission
-            ads_data = st.session_state.ads_df.to_dict('records')
-            
-            # Add image and thumbnail links
-            image_urls = [link.strip() for link in image_links.split('\n') if link.strip()] if image_links else []
-            thumbnail_url = thumbnail_link.strip() if thumbnail_link else ""
-            
-            for ad in ads_data:
-                ad["Imagens"] = image_urls
-                ad["Thumbnail (Video)"] = thumbnail_url
-                ad["SubmissionTime"] = str(datetime.now())
-            
             # Prepare final payload
-            payload = {
-                "tipo_requisicao": "criar_anuncio",
-                "dados": ads_data,
-                "timestamp": str(datetime.now())
-            }
+            payload = build_ads_payload(ads_df, image_links, thumbnail_link)
             
             # Send to webhook
-            webhook_url = "https://ferrazpiai-n8n-editor.uyk8ty.easypanel.host/webhook-test/e78ecade-5474-4877-93a6-f91980088282"
-            success, message = send_to_webhook(payload, webhook_url)
+            success, message = send_to_webhook(payload, WEBHOOK_URL)
             
             if success:
                 st.markdown("✅ Envio feito com sucesso!")
                 st.markdown(f'<div class="success-message">{message}</div>', unsafe_allow_html=True)
                 # Clear form after successful submission
-                st.session_state.ads_df = pd.DataFrame(columns=[
-                    "Nome Anúncio", "Tipo de Anúncio", "ID da Página do Facebook", 
-                    "Status do Anúncio", "Link de Destino", "Texto do Anúncio", 
-                    "Call to Action (CTA)", "BM Conectada", "ID Conta de Anúncios"
-                ])
+                st.session_state.ads_table.save(pd.DataFrame(columns=ADS_COLUMNS))
                 sleep(5)
                 st.rerun()
             else:
                 st.markdown(f'<div class="error-message">{message}</div>', unsafe_allow_html=True)
             
             st.subheader("📋 Preview JSON")
-            st.json(payload, expanded=False)
+            st.json(preview.truncate(payload), expanded=False)
+
+# Campaign templates
+CAMPAIGN_TEMPLATES = {
+    "Lead Gen for Real Estate": {
+        "Tipo de Campanha": "ABO",
+        "Objetivo da Campanha": "LEAD_GENERATION",
+        "Status da Campanha": "ACTIVE",
+        "Tipo de Otimização": "LEAD_GENERATION",
+        "Cobrança do Adset": "IMPRESSIONS",
+        "Estratégia de Lance": "LOWEST_COST_WITHOUT_CAP",
+        "Tipo de Anúncio": "Image",
+        "CTA": "LEARN_MORE",
+        "Tipo de Destino": "WEBSITE"
+    },
+    "E-commerce Conversions": {
+        "Tipo de Campanha": "CBO",
+        "Objetivo da Campanha": "SALES",
+        "Status da Campanha": "ACTIVE",
+        "Tipo de Otimização": "CONVERSIONS",
+        "Cobrança do Adset": "IMPRESSIONS",
+        "Estratégia de Lance": "COST_CAP",
+        "Tipo de Anúncio": "Carousel",
+        "CTA": "BUY_NOW",
+        "Tipo de Destino": "WEBSITE"
+    }
+}
+
+CAMPAIGN_OBJECTIVES = ["AWARENESS", "TRAFFIC", "ENGAGEMENT", "LEAD_GENERATION", "APP_PROMOTION", "SALES"]
+
+# Optimization types offered (and considered compatible) per campaign objective
+OPTIMIZATION_OPTIONS = {
+    "AWARENESS": ["IMPRESSIONS", "REACH", "BRAND_AWARENESS"],
+    "TRAFFIC": ["LINK_CLICKS", "LANDING_PAGE_VIEWS"],
+    "ENGAGEMENT": ["POST_ENGAGEMENT", "PAGE_LIKES", "EVENT_RESPONSES"],
+    "LEAD_GENERATION": ["LEAD_GENERATION", "CONVERSIONS"],
+    "APP_PROMOTION": ["APP_INSTALLS", "APP_EVENTS"],
+    "SALES": ["CONVERSIONS", "CATALOG_SALES", "VALUE"]
+}
+
+# Destination types each CTA may not work with
+INCOMPATIBLE_CTA_DESTINATION = {
+    "BUY_NOW": ["PHONE_CALL"],
+    "LEARN_MORE": [],
+    "SIGN_UP": ["PHONE_CALL"],
+    "DOWNLOAD": ["PHONE_CALL", "MESSENGER"],
+    "GET_QUOTE": ["APP"],
+    "CONTACT_US": [],
+    "APPLY_NOW": ["PHONE_CALL"],
+    "BOOK_NOW": ["APP"],
+    "GET_OFFER": ["PHONE_CALL"],
+    "SUBSCRIBE": ["PHONE_CALL"],
+    "WATCH_MORE": ["PHONE_CALL"]
+}
+
+# Function to show the objective/optimization and CTA/destination warnings
+def show_compatibility_warnings(campaign_data):
+    objective = campaign_data["Objetivo da Campanha"]
+    optimization_type = campaign_data["Tipo de Otimização"]
+    if objective and optimization_type and optimization_type not in OPTIMIZATION_OPTIONS.get(objective, []):
+        st.warning(f"⚠️ O tipo de otimização '{optimization_type}' pode não ser compatível com o objetivo da campanha '{objective}'.")
+    cta = campaign_data["CTA"]
+    destination_type = campaign_data["Tipo de Destino"]
+    if cta and destination_type and destination_type in INCOMPATIBLE_CTA_DESTINATION.get(cta, []):
+        st.warning(f"⚠️ O CTA '{cta}' pode não ser compatível com o tipo de destino '{destination_type}'.")
+
+# Function for the campaign payload preview. As a fragment (where Streamlit
+# has them), its toggle and "show more" button rerun only this section.
+@fragment
+def show_campaign_preview(campaign_data):
+    if st.toggle("📋 Pré-visualizar envio", key="campaign_preview_on"):
+        with perf.timed("preview", page="criar_campanha"):
+            campaign_payload = build_campaign_payload(campaign_data)
+            summary, diffs = preview.preview_payload(campaign_payload)
+            render_payload_preview(summary, diffs, lambda items: campaign_payload, "campaign_preview_items")
 
 # Function for Create Campaigns page
 def show_create_campaigns_page():
     st.markdown('<h1 class="main-header">🚀 Criar Campanhas</h1>', unsafe_allow_html=True)
     st.markdown('<p class="sub-header">Crie campanhas completas com entrada manual ou templates</p>', unsafe_allow_html=True)
     
-    # Campaign templates
-    templates = {
-        "Lead Gen for Real Estate": {
-            "Tipo de Campanha": "ABO",
-            "Objetivo da Campanha": "LEAD_GENERATION",
-            "Status da Campanha": "ACTIVE",
-            "Tipo de Otimização": "LEAD_GENERATION",
-            "Cobrança do Adset": "IMPRESSIONS",
-            "Estratégia de Lance": "LOWEST_COST_WITHOUT_CAP",
-            "Tipo de Anúncio": "Image",
-            "CTA": "LEARN_MORE",
-            "Tipo de Destino": "WEBSITE"
-        },
-        "E-commerce Conversions": {
-            "Tipo de Campanha": "CBO",
-            "Objetivo da Campanha": "SALES",
-            "Status da Campanha": "ACTIVE",
-            "Tipo de Otimização": "CONVERSIONS",
-            "Cobrança do Adset": "IMPRESSIONS",
-            "Estratégia de Lance": "COST_CAP",
-            "Tipo de Anúncio": "Carousel",
-            "CTA": "BUY_NOW",
-            "Tipo de Destino": "WEBSITE"
-        }
-    }
-    
     # Template selection
     st.subheader("📋 Template de Campanha (Opcional)")
-    selected_template = st.selectbox(
-        "Selecione um template ou crie do zero",
-        ["Criar do zero"] + list(templates.keys())
-    )
+    col1, col2 = st.columns(2)
+    with col1:
+        selected_template = st.selectbox(
+            "Selecione um template ou crie do zero",
+            ["Criar do zero"] + list(CAMPAIGN_TEMPLATES.keys())
+        )
     
-    # Initialize form values based on template
-    if selected_template != "Criar do zero" and selected_template in templates:
-        template_data = templates[selected_template]
+    # Initialize form values based on the restored draft and template
+    campaign_draft = st.session_state.get("campaign_draft", {})
+    if selected_template != "Criar do zero" and selected_template in CAMPAIGN_TEMPLATES:
+        template_data = {**campaign_draft, **CAMPAIGN_TEMPLATES[selected_template]}
     else:
-        template_data = {}
+        template_data = campaign_draft
+    
+    # The objective sits outside the form: it decides the optimization options
+    with col2:
+        campaign_objective = st.selectbox(
+            "Objetivo da Campanha",
+            CAMPAIGN_OBJECTIVES,
+            index=option_index(CAMPAIGN_OBJECTIVES, template_data.get("Objetivo da Campanha", "AWARENESS"))
+        )
+    
+    schedule = render_schedule_options("campaign")
     
-    # Create tabs for different sections
-    tab1, tab2, tab3, tab4 = st.tabs(["📊 Info Geral da Campanha", "⚙️ Configurações do Ad Set", "🎨 Info Criativa", "🎯 Segmentação de Audiência"])
+    # The tabs are one form: typing and picking options don't rerun the page,
+    # the values are applied together by "Salvar rascunho", "Validar" or by
+    # sending. Until then nothing is autosaved or validated.
+    form = st.form("campaign_form")
+    with form:
+        # Create tabs for different sections
+        tab1, tab2, tab3, tab4 = st.tabs(["📊 Info Geral da Campanha", "⚙️ Configurações do Ad Set", "🎨 Info Criativa", "🎯 Segmentação de Audiência"])
     
     with tab1:
         st.subheader("Informações Gerais da Campanha")
         
         col1, col2 = st.columns(2)
         with col1:
-            page_id = st.number_input("ID da Página", min_value=1, value=None, placeholder="Digite o ID da Página")
-            ad_account_id = st.number_input("ID da Conta de Anúncios", min_value=1, value=None, placeholder="Digite o ID da Conta")
+            page_id = st.number_input("ID da Página", min_value=1, value=campaign_draft.get("ID da Página"), placeholder="Digite o ID da Página")
+            ad_account_id = st.number_input("ID da Conta de Anúncios", min_value=1, value=campaign_draft.get("ID da Conta de Anúncios"), placeholder="Digite o ID da Conta")
         
         with col2:
             campaign_type = st.selectbox(
                 "Tipo de Campanha",
                 ["ABO", "CBO", "ADV+"],
-                index=["ABO", "CBO", "ADV+"].index(template_data.get("Tipo de Campanha", "ABO"))
+                index=option_index(["ABO", "CBO", "ADV+"], template_data.get("Tipo de Campanha", "ABO"))
             )
         
-        campaign_name = st.text_input("Nome da Campanha", placeholder="Digite o Nome da Campanha")
-        
-        campaign_objective = st.selectbox(
-            "Objetivo da Campanha",
-            ["AWARENESS", "TRAFFIC", "ENGAGEMENT", "LEAD_GENERATION", "APP_PROMOTION", "SALES"],
-            index=["AWARENESS", "TRAFFIC", "ENGAGEMENT", "LEAD_GENERATION", "APP_PROMOTION", "SALES"].index(template_data.get("Objetivo da Campanha", "AWARENESS"))
-        )
+        campaign_name = st.text_input("Nome da Campanha", value=campaign_draft.get("Nome da Campanha", ""), placeholder="Digite o Nome da Campanha")
     
     with tab2:
         st.subheader("Configurações do Ad Set")
@@ -362,28 +600,19 @@ def show_create_campaigns_page():
             campaign_status = st.selectbox(
                 "Status da Campanha",
                 ["ACTIVE", "PAUSED"],
-                index=["ACTIVE", "PAUSED"].index(template_data.get("Status da Campanha", "ACTIVE"))
+                index=option_index(["ACTIVE", "PAUSED"], template_data.get("Status da Campanha", "ACTIVE"))
             )
             
-            ad_set_name = st.text_input("Nome do Ad Set", placeholder="Digite o Nome do Ad Set")
+            ad_set_name = st.text_input("Nome do Ad Set", value=campaign_draft.get("Nome do Ad Set", ""), placeholder="Digite o Nome do Ad Set")
         
         # Dynamic optimization options based on campaign objective
-        optimization_options = {
-            "AWARENESS": ["IMPRESSIONS", "REACH", "BRAND_AWARENESS"],
-            "TRAFFIC": ["LINK_CLICKS", "LANDING_PAGE_VIEWS"],
-            "ENGAGEMENT": ["POST_ENGAGEMENT", "PAGE_LIKES", "EVENT_RESPONSES"],
-            "LEAD_GENERATION": ["LEAD_GENERATION", "CONVERSIONS"],
-            "APP_PROMOTION": ["APP_INSTALLS", "APP_EVENTS"],
-            "SALES": ["CONVERSIONS", "CATALOG_SALES", "VALUE"]
-        }
-        
-        current_optimization_options = optimization_options.get(campaign_objective, ["IMPRESSIONS"])
+        current_optimization_options = OPTIMIZATION_OPTIONS.get(campaign_objective, ["IMPRESSIONS"])
         
         with col2:
             optimization_type = st.selectbox(
                 "Tipo de Otimização",
                 current_optimization_options,
-                index=current_optimization_options.index(template_data.get("Tipo de Otimização", current_optimization_options[0]))
+                index=option_index(current_optimization_options, template_data.get("Tipo de Otimização", current_optimization_options[0]))
             )
         
         # Dynamic billing event options
@@ -394,7 +623,7 @@ def show_create_campaigns_page():
             billing_event = st.selectbox(
                 "Cobrança do Adset",
                 billing_event_options,
-                index=billing_event_options.index(template_data.get("Cobrança do Adset", "IMPRESSIONS"))
+                index=option_index(billing_event_options, template_data.get("Cobrança do Adset", "IMPRESSIONS"))
             )
         
         # Bid strategy options
@@ -404,15 +633,15 @@ def show_create_campaigns_page():
             bid_strategy = st.selectbox(
                 "Estratégia de Lance",
                 bid_strategy_options,
-                index=bid_strategy_options.index(template_data.get("Estratégia de Lance", "LOWEST_COST_WITHOUT_CAP"))
+                index=option_index(bid_strategy_options, template_data.get("Estratégia de Lance", "LOWEST_COST_WITHOUT_CAP"))
             )
         
         col1, col2 = st.columns(2)
         with col1:
-            daily_budget = st.number_input("Orçamento Diário", min_value=1.0, step=0.5, format="%.2f")
+            daily_budget = st.number_input("Orçamento Diário", min_value=1.0, value=campaign_draft.get("Orçamento Diário", 1.0), step=0.5, format="%.2f")
         
         with col2:
-            bid_cap = st.number_input("Valor Máximo de Lance (Opcional)", min_value=0.1, step=0.1, format="%.2f", value=None)
+            bid_cap = st.number_input("Valor Máximo de Lance (Opcional)", min_value=0.1, step=0.1, format="%.2f", value=campaign_draft.get("Valor Máximo de Lance"))
     
     with tab3:
         st.subheader("Informações Criativas")
@@ -422,15 +651,15 @@ def show_create_campaigns_page():
             ad_type = st.selectbox(
                 "Tipo de Anúncio",
                 ["Image", "Video", "Carousel"],
-                index=["Image", "Video", "Carousel"].index(template_data.get("Tipo de Anúncio", "Image"))
+                index=option_index(["Image", "Video", "Carousel"], template_data.get("Tipo de Anúncio", "Image"))
             )
             
-            ad_name = st.text_input("Nome do Anúncio", placeholder="Digite o Nome do Anúncio")
+            ad_name = st.text_input("Nome do Anúncio", value=campaign_draft.get("Nome do Anúncio", ""), placeholder="Digite o Nome do Anúncio")
         
         with col2:
-            destination_link = st.text_input("Link de Destino", placeholder="https://exemplo.com")
+            destination_link = st.text_input("Link de Destino", value=campaign_draft.get("Link de Destino", ""), placeholder="https://exemplo.com")
         
-        ad_text = st.text_area("Texto do Anúncio", placeholder="Digite o texto do seu anúncio aqui...")
+        ad_text = st.text_area("Texto do Anúncio", value=campaign_draft.get("Texto do Anúncio", ""), placeholder="Digite o texto do seu anúncio aqui...")
         
         col1, col2 = st.columns(2)
         with col1:
@@ -440,7 +669,7 @@ def show_create_campaigns_page():
             cta = st.selectbox(
                 "Call to Action",
                 cta_options,
-                index=cta_options.index(template_data.get("CTA", "LEARN_MORE"))
+                index=option_index(cta_options, template_data.get("CTA", "LEARN_MORE"))
             )
         
         with col2:
@@ -450,7 +679,7 @@ def show_create_campaigns_page():
             destination_type = st.selectbox(
                 "Tipo de Destino",
                 destination_type_options,
-                index=destination_type_options.index(template_data.get("Tipo de Destino", "WEBSITE"))
+                index=option_index(destination_type_options, template_data.get("Tipo de Destino", "WEBSITE"))
             )
         
         # Upload sections for campaigns
@@ -461,6 +690,7 @@ def show_create_campaigns_page():
             st.markdown("Link do Drive da Imagem")
             campaign_image_links = st.text_area(
                 "Adicione a URL do drive de sua Imagem / Vídeo Aqui",
+                value=campaign_draft.get("Imagens", ""),
                 placeholder="https://drive.google.com/file/d/...",
                 height=100,
                 label_visibility="collapsed",
@@ -473,6 +703,7 @@ def show_create_campaigns_page():
             st.markdown("Link do Drive da Thumbnail")
             campaign_thumbnail_link = st.text_area(
                 "Adicione a URL do drive de sua Thumbnail Aqui",
+                value=campaign_draft.get("Thumbnail (Video)", ""),
                 placeholder="https://drive.google.com/file/d/...",
                 height=100,
                 label_visibility="collapsed",
@@ -487,149 +718,152 @@ def show_create_campaigns_page():
         with col1:
             connected_bm = st.selectbox(
                 "Conta em Qual BM?",
-                ["Piai & Associados", "V4 Ferraz & Co"]
+                ["Piai & Associados", "V4 Ferraz & Co"],
+                index=option_index(["Piai & Associados", "V4 Ferraz & Co"], campaign_draft.get("Conta em Qual BM?"))
             )
         
         col1, col2 = st.columns(2)
         with col1:
-            min_age = st.number_input("Idade Mínima", min_value=13, max_value=65, value=18)
+            min_age = st.number_input("Idade Mínima", min_value=13, max_value=65, value=campaign_draft.get("Idade Mínima", 18))
         
         with col2:
-            max_age = st.number_input("Idade Máxima", min_value=13, max_value=65, value=65)
+            max_age = st.number_input("Idade Máxima", min_value=13, max_value=65, value=campaign_draft.get("Idade Máxima", 65))
         
         col1, col2, col3 = st.columns(3)
         with col1:
-            city = st.text_input("Cidade", placeholder="ex: São Paulo")
+            city = st.text_input("Cidade", value=campaign_draft.get("Cidade", ""), placeholder="ex: São Paulo")
         
         with col2:
-            state = st.text_input("Estado (SP, AL, MT...)", placeholder="ex: SP, RJ")
+            state = st.text_input("Estado (SP, AL, MT...)", value=campaign_draft.get("Estado (SP, AL, MT...)", ""), placeholder="ex: SP, RJ")
         
         with col3:
-            country = st.text_input("País (BR, Us...)", placeholder="ex: BR, US")
+            country = st.text_input("País (BR, Us...)", value=campaign_draft.get("País (BR, EUA...)", ""), placeholder="ex: BR, US")
         
-        radius = st.slider("Raio de Distância (Milhas)", min_value=1, max_value=18, value=9)
-    
-    # Validation warnings
-    st.subheader("⚠️ Validação")
+        # Show how the applied targeting values were resolved
+        gazetteer = geo.load_gazetteer()
+        city_state = geo.single_state(gazetteer, state)
+        if geo.covers_countries(gazetteer, country):
+            with col1:
+                show_geo_resolution(gazetteer.resolve_field(geo.CITY, city, city_state), gazetteer.complete[geo.CITY])
+            with col2:
+                show_geo_resolution(gazetteer.resolve_field(geo.STATE, state))
+        else:
+            # Only Brazilian states and cities are in the local lists
+            for column, text in ((col1, city), (col2, state)):
+                if text.strip():
+                    column.caption("ℹ️ Fora do Brasil: enviado como digitado, sem verificação")
+        with col3:
+            show_geo_resolution(gazetteer.resolve_field(geo.COUNTRY, country))
+        
+        radius = st.slider("Raio de Distância (Milhas)", min_value=1, max_value=18, value=campaign_draft.get("Raio de Distância", 9))
     
-    # Check for compatibility between objective and optimization
-    valid_combinations = {
-        "AWARENESS": ["IMPRESSIONS", "REACH", "BRAND_AWARENESS"],
-        "TRAFFIC": ["LINK_CLICKS", "LANDING_PAGE_VIEWS"],
-        "ENGAGEMENT": ["POST_ENGAGEMENT", "PAGE_LIKES", "EVENT_RESPONSES"],
-        "LEAD_GENERATION": ["LEAD_GENERATION", "CONVERSIONS"],
-        "APP_PROMOTION": ["APP_INSTALLS", "APP_EVENTS"],
-        "SALES": ["CONVERSIONS", "CATALOG_SALES", "VALUE"]
-    }
+    with form:
+        col1, col2, col3, col4 = st.columns([1.5, 1, 1, 1])
+        with col1:
+            st.caption("As alterações são salvas no rascunho e validadas ao clicar em um dos botões.")
+        with col2:
+            save_button = st.form_submit_button("💾 Salvar rascunho", use_container_width=True, disabled=not operator,
+                                                help=None if operator else "Informe o operador na barra lateral para salvar rascunhos.")
+        with col3:
+            validate_button = st.form_submit_button("🔎 Validar", use_container_width=True)
+        with col4:
+            submit_button = st.form_submit_button("⏰ Agendar Campanha" if schedule else "🚀 Enviar Campanha", type="primary", use_container_width=True)
     
-    if campaign_objective and optimization_type:
-        if optimization_type not in valid_combinations.get(campaign_objective, []):
-            st.warning(f"⚠️ O tipo de otimização '{optimization_type}' pode não ser compatível com o objetivo da campanha '{campaign_objective}'.")
-    
-    # Check for compatibility between CTA and destination type
-    incompatible_cta_destination = {
-        "BUY_NOW": ["PHONE_CALL"],
-        "LEARN_MORE": [],
-        "SIGN_UP": ["PHONE_CALL"],
-        "DOWNLOAD": ["PHONE_CALL", "MESSENGER"],
-        "GET_QUOTE": ["APP"],
-        "CONTACT_US": [],
-        "APPLY_NOW": ["PHONE_CALL"],
-        "BOOK_NOW": ["APP"],
-        "GET_OFFER": ["PHONE_CALL"],
-        "SUBSCRIBE": ["PHONE_CALL"],
-        "WATCH_MORE": ["PHONE_CALL"]
+    # Data for submission, also used by the preview and the draft
+    campaign_data = {
+        "ID da Página": page_id,
+        "ID da Conta de Anúncios": ad_account_id,
+        "Tipo de Campanha": campaign_type,
+        "Nome da Campanha": campaign_name,
+        "Objetivo da Campanha": campaign_objective,
+        "Status da Campanha": campaign_status,
+        "Nome do Ad Set": ad_set_name,
+        "Tipo de Otimização": optimization_type,
+        "Cobrança do Adset": billing_event,
+        "Estratégia de Lance": bid_strategy,
+        "Orçamento Diário": daily_budget,
+        "Valor Máximo de Lance": bid_cap,
+        "Tipo de Anúncio": ad_type,
+        "Nome do Anúncio": ad_name,
+        "Texto do Anúncio": ad_text,
+        "Link de Destino": destination_link,
+        "CTA": cta,
+        "Tipo de Destino": destination_type,
+        "Imagens": parse_links(campaign_image_links),
+        "Thumbnail (Video)": campaign_thumbnail_link.strip() if campaign_thumbnail_link else "",
+        "Conta em Qual BM?": connected_bm,
+        "Idade Mínima": min_age,
+        "Idade Máxima": max_age,
+        "Cidade": city,
+        "Estado (SP, AL, MT...)": state,
+        "País (BR, EUA...)": country,
+        "Raio de Distância": radius
     }
+
+    # Autosave the form as the operator's draft (on every submit of the form);
+    # "Salvar rascunho" writes it right away instead of after the debounce
+    if operator:
+        drafts.schedule_form(operator, {
+            **campaign_data,
+            "Imagens": campaign_image_links,
+            "Thumbnail (Video)": campaign_thumbnail_link
+        })
+        if save_button:
+            drafts.flush(operator)
+            st.toast("💾 Rascunho salvo")
     
-    if cta and destination_type:
-        if destination_type in incompatible_cta_destination.get(cta, []):
-            st.warning(f"⚠️ O CTA '{cta}' pode não ser compatível com o tipo de destino '{destination_type}'.")
+    # Validation runs when asked for, or on submit below
+    if validate_button:
+        st.subheader("⚠️ Validação")
+        with perf.timed("validation", page="criar_campanha"):
+            errors = validate_campaign(campaign_data) + id_verifier.validate_record(campaign_data)
+        show_compatibility_warnings(campaign_data)
+        for error in errors:
+            if is_blocking(error):
+                st.error(format_validation_error(error))
+            else:
+                st.warning(format_validation_error(error))
+        if not errors:
+            st.markdown("✅ Todos os campos estão válidos!")
     
-    # Submit button
-    col1, col2, col3 = st.columns([2, 1, 2])
-    with col2:
-        submit_button = st.button("🚀 Enviar Campanha", type="primary", use_container_width=True)
+    # Preview of what will be sent
+    show_campaign_preview(campaign_data)
     
     # Process form submission
     if submit_button:
-        # Validate required fields
-        required_fields = {
-            "ID da Página": page_id,
-            "ID da Conta de Anúncios": ad_account_id,
-            "Nome da Campanha": campaign_name,
-            "Nome do Ad Set": ad_set_name,
-            "Nome do Anúncio": ad_name,
-            "Link de Destino": destination_link,
-            "Texto do Anúncio": ad_text
-        }
-        
-        missing_fields = [field for field, value in required_fields.items() if not value]
-        
-        # Validate URL format for Destination Link
-        invalid_url = False
-        if destination_link and not is_valid_url(destination_link):
-            invalid_url = True
+        # Validate required fields and the Destination Link format
+        with perf.timed("validation", page="criar_campanha"):
+            errors = validate_campaign(campaign_data) + id_verifier.validate_record(campaign_data)
+        missing_fields = [error["campo"] for error in errors if error["codigo"] == "obrigatorio"]
+        blocking = [error for error in errors if is_blocking(error)]
         
         if missing_fields:
             st.error(f"Por favor, preencha todos os campos obrigatórios: {', '.join(missing_fields)}")
-        elif invalid_url:
-            st.error("Link de Destino deve ser uma URL válida começando com http:// ou https://")
+        elif blocking:
+            st.error(blocking[0]["erro"])
         else:
-            # Prepare image and thumbnail links
-            image_urls = [link.strip() for link in campaign_image_links.split('\n') if link.strip()] if campaign_image_links else []
-            thumbnail_url = campaign_thumbnail_link.strip() if campaign_thumbnail_link else ""
-            
-            # Prepare data for submission
-            campaign_data = {
-                "ID da Página": page_id,
-                "ID da Conta de Anúncios": ad_account_id,
-                "Tipo de Campanha": campaign_type,
-                "Nome da Campanha": campaign_name,
-                "Objetivo da Campanha": campaign_objective,
-                "Status da Campanha": campaign_status,
-                "Nome do Ad Set": ad_set_name,
-                "Tipo de Otimização": optimization_type,
-                "Cobrança do Adset": billing_event,
-                "Estratégia de Lance": bid_strategy,
-                "Orçamento Diário": daily_budget,
-                "Valor Máximo de Lance": bid_cap,
-                "Tipo de Anúncio": ad_type,
-                "Nome do Anúncio": ad_name,
-                "Texto do Anúncio": ad_text,
-                "Link de Destino": destination_link,
-                "CTA": cta,
-                "Tipo de Destino": destination_type,
-                "Imagens": image_urls,
-                "Thumbnail (Video)": thumbnail_url,
-                "Conta em Qual BM?": connected_bm,
-                "Idade Mínima": min_age,
-                "Idade Máxima": max_age,
-                "Cidade": city,
-                "Estado (SP, AL, MT...)": state,
-                "País (BR, EUA...)": country,
-                "Raio de Distância": radius,
-                "SubmissionTime": str(datetime.now())
-            }
+            show_compatibility_warnings(campaign_data)
+            for error in errors:
+                st.warning(format_validation_error(error))
             
             # Prepare final payload
-            payload = {
-                "tipo_requisicao": "criar_campanha",
-                "dados": campaign_data,
-                "timestamp": str(datetime.now())
-            }
+            payload = build_campaign_payload(campaign_data)
             
-            # Send to webhook
-            webhook_url = "https://ferrazpiai-n8n-editor.uyk8ty.easypanel.host/webhook-test/e78ecade-5474-4877-93a6-f91980088282"
-            success, message = send_to_webhook(payload, webhook_url)
-            
-            if success:
-                st.markdown(f'<div class="success-message">{message}</div>', unsafe_allow_html=True)
+            if schedule:
+                job_id = job_scheduler.schedule(payload, schedule["inicio"], schedule["prioridade"], st.session_state.operator.strip())
+                show_scheduled([job_id], schedule)
             else:
-                st.markdown(f'<div class="error-message">{message}</div>', unsafe_allow_html=True)
+                # Send to webhook
+                success, message = send_to_webhook(payload, WEBHOOK_URL)
+                
+                if success:
+                    st.markdown(f'<div class="success-message">{message}</div>', unsafe_allow_html=True)
+                else:
+                    st.markdown(f'<div class="error-message">{message}</div>', unsafe_allow_html=True)
 
             # Display JSON preview
             st.subheader("📋 Preview JSON")
-            st.json(payload,expanded=False)
+            st.json(preview.truncate(payload), expanded=False)
 
 # Function for Documentation page
 def show_documentation_page():
@@ -973,6 +1207,318 @@ def show_documentation_page():
     
     st.table(pd.DataFrame(compatibility_data))
 
+# Function for Submission History page
+def show_history_page():
+    st.markdown('<h1 class="main-header">📜 Histórico de Envios</h1>', unsafe_allow_html=True)
+    st.markdown('<p class="sub-header">Registro de todos os payloads enviados ao webhook</p>', unsafe_allow_html=True)
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        request_type = st.selectbox("Tipo de Requisição", ["Todos", "criar_anuncio", "criar_campanha"], key="history_type")
+    with col2:
+        ad_account = st.text_input("ID Conta de Anúncios", placeholder="Todas", key="history_account")
+    with col3:
+        status = st.selectbox("Status", ["Todos", "Sucesso", "Erro"], key="history_status")
+    with col4:
+        date_range = st.date_input("Período", value=(), key="history_dates")
+    
+    since = until = None
+    if len(date_range) >= 1:
+        since = datetime.combine(date_range[0], datetime.min.time(), tzinfo=APP_TZ)
+    if len(date_range) == 2:
+        until = datetime.combine(date_range[1], datetime.min.time(), tzinfo=APP_TZ) + timedelta(days=1)
+    
+    filters = {
+        "request_type": None if request_type == "Todos" else request_type,
+        "ad_account": ad_account.strip() or None,
+        "ok": None if status == "Todos" else status == "Sucesso",
+        "since": since,
+        "until": until,
+    }
+    
+    # Keyset pagination: keep the cursor of every visited page, reset when filters change
+    filters_key = repr(filters)
+    if st.session_state.get("history_filters") != filters_key:
+        st.session_state.history_filters = filters_key
+        st.session_state.history_cursors = [None]
+    cursors = st.session_state.history_cursors
+    
+    page_size = 50
+    rows = audit_log.query_submissions(before=cursors[-1], limit=page_size + 1, **filters)
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+    
+    if not rows:
+        st.info("Nenhum envio encontrado para os filtros selecionados.")
+    else:
+        st.dataframe(pd.DataFrame([{
+            "ID": row["id"],
+            "Data": from_ms(row["ts"]).strftime("%Y-%m-%d %H:%M:%S"),
+            "Tipo": row["request_type"],
+            "Contas": row["accounts"] or "-",
+            "Linhas": row["row_count"],
+            "Bytes": row["bytes"],
+            "Latência (ms)": round(row["latency_ms"], 1),
+            "Status": "✅" if row["ok"] else f"❌ {row['status_code'] or ''}".strip(),
+            "Hash": row["payload_hash"][:16],
+            "Mensagem": row["message"] or "",
+        } for row in rows]), use_container_width=True, hide_index=True)
+    
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        st.button("⬅️ Anterior", disabled=len(cursors) == 1, use_container_width=True,
+                  on_click=cursors.pop)
+    with col2:
+        st.caption(f"Página {len(cursors)}")
+    with col3:
+        st.button("Próxima ➡️", disabled=not has_next, use_container_width=True,
+                  on_click=cursors.append, args=((rows[-1]["ts"], rows[-1]["id"]) if rows else None,))
+
+# Function to cancel the jobs picked on the Schedule page
+def cancel_selected_jobs():
+    cancelled = [job_id for job_id in st.session_state.get("schedule_cancel_ids", []) if job_scheduler.cancel(job_id)]
+    st.session_state.schedule_cancelled = cancelled
+    st.session_state.schedule_cancel_ids = []
+
+# Function to resend, or confirm as sent, the jobs picked for review
+def review_selected_jobs(resend):
+    action = job_scheduler.resend if resend else job_scheduler.confirm_sent
+    done = [job_id for job_id in st.session_state.get("schedule_review_ids", []) if action(job_id)]
+    st.session_state.schedule_reviewed = ("Reenviados" if resend else "Confirmados como enviados", done)
+    st.session_state.schedule_review_ids = []
+
+# Function to turn scheduler jobs into table rows
+def jobs_table(jobs):
+    def when(ms):
+        return from_ms(ms).strftime("%d/%m/%Y %H:%M:%S") if ms else "-"
+    return pd.DataFrame([{
+        "Nº": job["id"],
+        "Agendado para": when(job["run_at"]),
+        "Tipo": job["request_type"],
+        "Linhas": job["row_count"],
+        "Prioridade": "Alta" if job["priority"] > 0 else "Normal",
+        "Operador": job["operator"] or "-",
+        "Status": job["status"],
+        "Tentativas": job["attempts"],
+        "Início": when(job["started_at"]),
+        "Fim": when(job["finished_at"]),
+        "Mensagem": job["message"] or "",
+    } for job in jobs])
+
+# Function for the Schedule page: upcoming, running and recent jobs
+def show_schedule_page():
+    st.markdown('<h1 class="main-header">🗓️ Agendamentos</h1>', unsafe_allow_html=True)
+    st.markdown('<p class="sub-header">Envios programados, em execução e concluídos</p>', unsafe_allow_html=True)
+    
+    if not scheduler.DISPATCH_ENABLED:
+        st.caption("Os envios agendados são despachados pelo processo `python cli.py scheduler` (SCHEDULER_DISPATCH=0 neste servidor).")
+    
+    counts = job_scheduler.counts()
+    col1, col2, col3, col4, col5, col6 = st.columns([1, 1, 1, 1, 1, 1])
+    col1.metric("Agendados", counts.get(scheduler.PENDING, 0))
+    col2.metric("Em execução", counts.get(scheduler.RUNNING, 0))
+    col3.metric("Enviados", counts.get(scheduler.DONE, 0))
+    col4.metric("Com falha", counts.get(scheduler.FAILED, 0))
+    col5.metric("A revisar", counts.get(scheduler.REVIEW, 0))
+    with col6:
+        st.button("🔄 Atualizar", use_container_width=True)
+    st.caption(
+        f"Até {scheduler.MAX_JOBS_PER_WINDOW} envios e {scheduler.MAX_ROWS_PER_WINDOW} linhas a cada "
+        f"{scheduler.WINDOW_SECONDS}s; o excedente aguarda a janela seguinte."
+    )
+    
+    running = job_scheduler.jobs([scheduler.RUNNING])
+    if running:
+        st.subheader("⚙️ Em execução")
+        st.dataframe(jobs_table(running), use_container_width=True, hide_index=True)
+    
+    st.subheader("⏳ Próximos envios")
+    upcoming = job_scheduler.jobs([scheduler.PENDING], limit=200)
+    if not upcoming:
+        st.info("Nenhum envio agendado.")
+    else:
+        load = job_scheduler.planned_load()
+        if len(load) > 1:
+            st.bar_chart(pd.DataFrame({
+                "Hora": [from_ms(row["bucket"]).strftime("%d/%m %Hh") for row in load],
+                "Linhas": [row["rows"] for row in load],
+            }).set_index("Hora"))
+        st.dataframe(jobs_table(upcoming), use_container_width=True, hide_index=True)
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            st.multiselect("Cancelar envios", [job["id"] for job in upcoming], key="schedule_cancel_ids",
+                           placeholder="Selecione os números dos envios", label_visibility="collapsed")
+        with col2:
+            st.button("🗑️ Cancelar selecionados", use_container_width=True, on_click=cancel_selected_jobs,
+                      disabled=not st.session_state.get("schedule_cancel_ids"))
+    if st.session_state.get("schedule_cancelled"):
+        st.success(f"Cancelados: {', '.join(map(str, st.session_state.pop('schedule_cancelled')))}")
+    
+    # Failed or interrupted jobs are never resent on their own: the webhook
+    # creates campaigns in Meta, so a second send may duplicate them
+    review = job_scheduler.jobs([scheduler.REVIEW, scheduler.FAILED], limit=100)
+    if review:
+        st.subheader("⚠️ A revisar")
+        st.caption("Falhas e envios interrompidos não são reenviados automaticamente. Confira no n8n/Meta se chegaram antes de reenviar.")
+        st.dataframe(jobs_table(review), use_container_width=True, hide_index=True)
+        col1, col2, col3 = st.columns([2, 1, 1])
+        with col1:
+            st.multiselect("Envios a revisar", [job["id"] for job in review], key="schedule_review_ids",
+                           placeholder="Selecione os números dos envios", label_visibility="collapsed")
+        selected = bool(st.session_state.get("schedule_review_ids"))
+        with col2:
+            st.button("🔁 Reenviar", use_container_width=True, on_click=review_selected_jobs, args=(True,),
+                      disabled=not selected)
+        with col3:
+            st.button("✅ Já chegou ao n8n", use_container_width=True, on_click=review_selected_jobs, args=(False,),
+                      disabled=not selected, help="Marca envios interrompidos como enviados")
+    if st.session_state.get("schedule_reviewed"):
+        label, done = st.session_state.pop("schedule_reviewed")
+        if done:
+            st.success(f"{label}: {', '.join(map(str, done))}")
+        else:
+            st.warning("Nenhum envio alterado (só envios interrompidos podem ser confirmados).")
+    
+    st.subheader("📜 Recentes")
+    recent = job_scheduler.jobs([scheduler.DONE, scheduler.CANCELLED], limit=50)
+    if recent:
+        st.dataframe(jobs_table(recent), use_container_width=True, hide_index=True)
+    else:
+        st.caption("Nenhum envio agendado concluído ainda.")
+
+# Function for the hidden Performance page
+def show_performance_page():
+    st.markdown('<h1 class="main-header">⏱️ Performance</h1>', unsafe_allow_html=True)
+    st.markdown('<p class="sub-header">Latência por fase, erros de webhook e sessões ativas deste processo</p>', unsafe_allow_html=True)
+    # With several workers behind the load balancer each one has its own numbers
+    st.caption(f"Processo {os.getpid()} · validação em {workers.VALIDATION_PROCESSES or 'nenhum'} processo(s) auxiliar(es)")
+    
+    if not perf.ENABLED:
+        st.info("Instrumentação desativada (PERF_METRICS=0).")
+        return
+    
+    summary = perf.summarize()
+    webhook_stats = [stats for stats in summary if stats["phase"] == "webhook"]
+    webhook_calls = sum(stats["count"] for stats in webhook_stats)
+    webhook_errors = sum(stats["errors"] for stats in webhook_stats)
+    
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Sessões ativas", perf.active_sessions())
+    col2.metric("Envios ao webhook", webhook_calls)
+    col3.metric("Taxa de erro do webhook", f"{(webhook_errors / webhook_calls * 100) if webhook_calls else 0:.1f}%")
+    
+    if not summary:
+        st.info("Nenhuma amostra coletada ainda.")
+        return
+    
+    st.subheader("📊 Latência por fase")
+    st.dataframe(pd.DataFrame([{
+        "Página": stats["page"] or "-",
+        "Fase": stats["phase"],
+        "Amostras": stats["count"],
+        "Erros": stats["errors"],
+        "p50 (ms)": round(stats["p50"] * 1000, 2),
+        "p95 (ms)": round(stats["p95"] * 1000, 2),
+        "p99 (ms)": round(stats["p99"] * 1000, 2),
+        "Máx (ms)": round(stats["max"] * 1000, 2),
+    } for stats in summary]), use_container_width=True, hide_index=True)
+    
+    for stats in summary:
+        with st.expander(f"Histograma: {stats['page'] or '-'} / {stats['phase']}"):
+            # Convert cumulative bucket counts into per-bucket counts
+            previous = 0
+            counts = []
+            for cumulative in stats["buckets"] + [stats["count"]]:
+                counts.append(cumulative - previous)
+                previous = cumulative
+            labels = [f"≤{int(bound * 1000)}ms" for bound in perf.BUCKETS] + [f">{int(perf.BUCKETS[-1] * 1000)}ms"]
+            st.bar_chart(pd.DataFrame({"Amostras": counts}, index=pd.Index(labels, name="Latência")))
+    
+    st.subheader("🧠 Memória das sessões")
+    footprint = session_store.footprint()
+    col1, col2 = st.columns(2)
+    col1.metric("Em memória", f"{session_store.memory_bytes() / 1024 / 1024:.1f} MB",
+                help=f"Orçamento: {session_store.memory_budget / 1024 / 1024:.0f} MB")
+    col2.metric("Em disco", f"{sum(row['disk_bytes'] for row in footprint) / 1024 / 1024:.1f} MB")
+    if footprint:
+        st.dataframe(pd.DataFrame([{
+            "Sessão": row["session_id"][:8],
+            "Tabelas": row["tables"],
+            "Memória (KB)": round(row["memory_bytes"] / 1024, 1),
+            "Disco (KB)": round(row["disk_bytes"] / 1024, 1),
+            "Inativa há (s)": int(row["idle_seconds"]),
+        } for row in footprint]), use_container_width=True, hide_index=True)
+    
+    st.subheader("🔎 Cache de verificação de IDs")
+    id_stats = id_verifier.stats()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Backend", id_stats["backend"], help=f"Cache: {id_stats['cache']}")
+    col2.metric("IDs em cache", id_stats["cache_entries"])
+    col3.metric("Acertos do cache", f"{id_stats['hits'] / max(id_stats['hits'] + id_stats['misses'], 1) * 100:.0f}%")
+    col4.metric("Consultas ao backend", id_stats["lookups"])
+    
+    st.subheader("📤 Exportar")
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button("Prometheus (texto)", perf.export_prometheus(), file_name="metrics.prom", mime="text/plain", use_container_width=True)
+    with col2:
+        st.download_button("JSON Lines", perf.export_jsonl(), file_name="metrics.jsonl", mime="application/x-ndjson", use_container_width=True)
+
+# Shared across all sessions of this process
+@st.cache_resource
+def get_session_store():
+    return SessionStore()
+
+# Track this session for the Performance page and the session store
+ctx = get_script_run_ctx()
+session_id = ctx.session_id if ctx else None
+perf.touch_session(session_id)
+session_store = get_session_store()
+session_store.touch(session_id)
+session_store.maintain(current_session_id=session_id)
+
+# The Performance page is hidden unless enabled by env var or ?perf=1
+show_performance_nav = os.environ.get("PERF_PANEL") == "1" or st.experimental_get_query_params().get("perf", [""])[0] == "1"
+
+@st.cache_resource
+def get_draft_store():
+    return DraftStore()
+
+drafts = get_draft_store()
+
+# One verifier (and its TTL/LRU cache of checked ids) for every session
+@st.cache_resource
+def get_id_verifier():
+    return IdVerifier()
+
+id_verifier = get_id_verifier()
+
+# Validation process pool (VALIDATION_PROCESSES), started once per process
+@st.cache_resource
+def start_validation_pool():
+    workers.warm_up("core")
+    return True
+
+start_validation_pool()
+
+# Job store for scheduled submissions. Outside deployments (SCHEDULER_DISPATCH
+# unset) this process also dispatches, from the first page visit on
+@st.cache_resource
+def get_scheduler():
+    job_scheduler = scheduler.Scheduler()
+    return job_scheduler.start() if scheduler.DISPATCH_ENABLED else job_scheduler
+
+job_scheduler = get_scheduler()
+
+# Keep the operator in the URL so a browser refresh finds the same drafts
+def update_operator_query_param():
+    params = st.experimental_get_query_params()
+    if st.session_state.operator.strip():
+        params["operador"] = st.session_state.operator.strip()
+    else:
+        params.pop("operador", None)
+    st.experimental_set_query_params(**params)
+
 # Sidebar navigation
 with st.sidebar:
     # Use the new logo URL (you can replace this with the correct URL when available)
@@ -989,13 +1535,55 @@ with st.sidebar:
     if st.button("📚 Documentação", key="nav_documentation", use_container_width=True):
         st.session_state.page = 'Documentation'
     
+    if st.button("📜 Histórico", key="nav_history", use_container_width=True):
+        st.session_state.page = 'History'
+    
+    if st.button("🗓️ Agendamentos", key="nav_schedule", use_container_width=True):
+        st.session_state.page = 'Schedule'
+    
+    if show_performance_nav:
+        if st.button("⏱️ Performance", key="nav_performance", use_container_width=True):
+            st.session_state.page = 'Performance'
+    
+    st.divider()
+    st.text_input(
+        "👤 Operador",
+        value=st.experimental_get_query_params().get("operador", [""])[0],
+        placeholder="Seu nome ou e-mail",
+        help="Rascunhos da tabela de anúncios e do formulário de campanha são salvos automaticamente por operador.",
+        key="operator",
+        on_change=update_operator_query_param
+    )
+    operator = st.session_state.operator.strip()
+    
+    # Restore the operator's drafts once per session (and when the operator changes)
+    if operator and st.session_state.get("draft_restored_for") != operator:
+        restored_table, restored_form = drafts.restore(operator)
+        if restored_table is not None:
+            st.session_state.ads_table = session_store.handle(session_id, "ads_df")
+            st.session_state.ads_table.save(restored_table)
+        st.session_state.campaign_draft = restored_form
+        st.session_state.draft_restored_for = operator
+        if restored_table is not None or restored_form:
+            st.caption("💾 Rascunho restaurado")
+    elif not operator:
+        st.caption("Informe o operador para ativar o salvamento automático.")
+    
     st.divider()
     st.caption("© 2025 GTBOT")
 
 # Main content based on selected page
 if st.session_state.page == 'Create Ads':
-    show_create_ads_page()
+    with perf.timed("render", page="criar_anuncio"):
+        show_create_ads_page()
 elif st.session_state.page == 'Create Campaigns':
-    show_create_campaigns_page()
+    with perf.timed("render", page="criar_campanha"):
+        show_create_campaigns_page()
 elif st.session_state.page == 'Documentation':
     show_documentation_page()
+elif st.session_state.page == 'History':
+    show_history_page()
+elif st.session_state.page == 'Schedule':
+    show_schedule_page()
+elif st.session_state.page == 'Performance':
+    show_performance_page()
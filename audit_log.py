@@ -0,0 +1,219 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import logging
+import threading
+
+# Append-only log of every payload sent to the webhook, one row per payload.
+# Accounts live in a child table so a multi-account ads batch stays one entry
+# while still being found through the account index.
+AUDIT_DB_PATH = os.environ.get("AUDIT_DB_PATH", os.path.join("data", "audit.sqlite3"))
+
+ACCOUNT_FIELDS = ("ID Conta de Anúncios", "ID da Conta de Anúncios")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS submissions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts INTEGER NOT NULL,
+    request_type TEXT NOT NULL,
+    row_count INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    latency_ms REAL NOT NULL,
+    status_code INTEGER NOT NULL,
+    ok INTEGER NOT NULL,
+    payload_hash BLOB NOT NULL,
+    message TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_submissions_ts ON submissions (ts);
+CREATE INDEX IF NOT EXISTS idx_submissions_type_ts ON submissions (request_type, ts);
+DROP INDEX IF EXISTS idx_submissions_type;
+CREATE TABLE IF NOT EXISTS submission_accounts (
+    submission_id INTEGER NOT NULL REFERENCES submissions (id),
+    ad_account TEXT NOT NULL,
+    row_count INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    PRIMARY KEY (ad_account, submission_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_submission_accounts_ts ON submission_accounts (ad_account, ts, submission_id);
+CREATE INDEX IF NOT EXISTS idx_submission_accounts_submission ON submission_accounts (submission_id);
+CREATE TABLE IF NOT EXISTS account_snapshots (
+    request_type TEXT NOT NULL,
+    ad_account TEXT NOT NULL,
+    submission_id INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    snapshot BLOB NOT NULL,
+    PRIMARY KEY (request_type, ad_account)
+) WITHOUT ROWID;
+"""
+
+logger = logging.getLogger(__name__)
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = set()
+
+
+def _connect(path=None):
+    path = path or AUDIT_DB_PATH
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(path)
+    if conn is None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with _init_lock:
+            if path not in _initialized:
+                conn.executescript(_SCHEMA)
+                _initialized.add(path)
+        connections[path] = conn
+    return conn
+
+
+def normalize_account(value):
+    if value is None:
+        return None
+    if isinstance(value, float):
+        if value != value:
+            return None
+        if value.is_integer():
+            value = int(value)
+    value = str(value).strip()
+    return value or None
+
+
+# Count rows per ad account in a webhook payload
+def accounts_in_payload(payload):
+    data = payload.get("dados") if isinstance(payload, dict) else None
+    records = data if isinstance(data, list) else [data] if isinstance(data, dict) else []
+    counts = {}
+    for record in records:
+        account = None
+        for field in ACCOUNT_FIELDS:
+            if field in record:
+                account = normalize_account(record[field])
+                break
+        if account:
+            counts[account] = counts.get(account, 0) + 1
+    return counts, len(records)
+
+
+def _encode_snapshot(snapshot):
+    return zlib.compress(json.dumps(snapshot, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+
+def record_submission(payload, body, latency_seconds, status_code, ok, message="", path=None):
+    accounts, row_count = accounts_in_payload(payload)
+    request_type = payload.get("tipo_requisicao", "") if isinstance(payload, dict) else ""
+    ts = int(time.time() * 1000)
+    conn = _connect(path)
+    with conn:
+        cursor = conn.execute(
+            "INSERT INTO submissions (ts, request_type, row_count, bytes, latency_ms, status_code, ok, payload_hash, message) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                ts,
+                request_type,
+                row_count,
+                len(body),
+                latency_seconds * 1000,
+                status_code,
+                1 if ok else 0,
+                hashlib.sha256(body).digest(),
+                message[:500] if message else None,
+            ),
+        )
+        conn.executemany(
+            "INSERT INTO submission_accounts (submission_id, ad_account, row_count, ts) VALUES (?, ?, ?, ?)",
+            [(cursor.lastrowid, account, count, ts) for account, count in accounts.items()],
+        )
+    return cursor.lastrowid
+
+
+# snapshots: {account: fingerprint} of a successful submission (see
+# preview.payload_snapshots). Each replaces the account's previous one unless
+# that one is from a later submission (snapshots are written in the
+# background, possibly by another process).
+def save_snapshots(request_type, submission_id, snapshots, path=None):
+    conn = _connect(path)
+    with conn:
+        conn.executemany(
+            "INSERT INTO account_snapshots (request_type, ad_account, submission_id, ts, snapshot) "
+            "SELECT ?, ?, id, ts, ? FROM submissions WHERE id = ? "
+            "ON CONFLICT (request_type, ad_account) DO UPDATE SET "
+            "submission_id = excluded.submission_id, ts = excluded.ts, snapshot = excluded.snapshot "
+            "WHERE (excluded.ts, excluded.submission_id) > (account_snapshots.ts, account_snapshots.submission_id)",
+            [(request_type, account, _encode_snapshot(snapshot), submission_id)
+             for account, snapshot in snapshots.items() if account],
+        )
+
+
+# Never let a logging failure break a submission
+def safe_record_submission(*args, **kwargs):
+    try:
+        return record_submission(*args, **kwargs)
+    except Exception:
+        logger.exception("Falha ao gravar o log de envios")
+        return None
+
+
+# Last successful submission of an account: (ts in ms, snapshot) or None
+def load_snapshot(request_type, ad_account, path=None):
+    row = _connect(path).execute(
+        "SELECT ts, snapshot FROM account_snapshots WHERE request_type = ? AND ad_account = ?",
+        (request_type, ad_account),
+    ).fetchone()
+    if row is None:
+        return None
+    return row["ts"], json.loads(zlib.decompress(row["snapshot"]).decode("utf-8"))
+
+
+# Keyset-paginated query, newest first. Pass (ts, id) of the last row of the
+# previous page as `before` to fetch the next one; cost stays constant at any
+# depth. Pages follow (ts, id), not id alone: with several processes writing
+# (or a clock adjustment) ids and timestamps don't grow together.
+def query_submissions(request_type=None, ad_account=None, ok=None, since=None, until=None,
+                      before=None, limit=50, path=None):
+    clauses = []
+    params = []
+    if ad_account:
+        # Drive the scan from the (ad_account, ts, submission_id) index
+        source = "submission_accounts a JOIN submissions s ON s.id = a.submission_id"
+        ts_column, id_column = "a.ts", "a.submission_id"
+        clauses.append("a.ad_account = ?")
+        params.append(normalize_account(ad_account))
+    else:
+        source = "submissions s"
+        ts_column, id_column = "s.ts", "s.id"
+    if request_type:
+        clauses.append("s.request_type = ?")
+        params.append(request_type)
+    if ok is not None:
+        clauses.append("s.ok = ?")
+        params.append(1 if ok else 0)
+    if since is not None:
+        clauses.append(f"{ts_column} >= ?")
+        params.append(int(since.timestamp() * 1000))
+    if until is not None:
+        clauses.append(f"{ts_column} < ?")
+        params.append(int(until.timestamp() * 1000))
+    if before is not None:
+        clauses.append(f"({ts_column}, {id_column}) < (?, ?)")
+        params.extend(before)
+
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    rows = _connect(path).execute(
+        "SELECT s.id, s.ts, s.request_type, s.row_count, s.bytes, s.latency_ms, s.status_code, s.ok, "
+        "s.payload_hash, s.message, "
+        "(SELECT group_concat(b.ad_account, ', ') FROM submission_accounts b WHERE b.submission_id = s.id) AS accounts "
+        f"FROM {source} {where} ORDER BY {ts_column} DESC, {id_column} DESC LIMIT ?",
+        params + [limit],
+    ).fetchall()
+    return [dict(row, payload_hash=row["payload_hash"].hex()) for row in rows]
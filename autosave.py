@@ -0,0 +1,232 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+
+import pandas as pd
+
+# Draft autosave for the ads table and the campaign form, keyed by operator.
+#
+# Layout per operator under DRAFTS_DIR/<key>/:
+#   table-NNNNNN.parquet   compacted snapshot of the ads table (index in "__row")
+#   delta-NNNNNN.parquet   rows changed since the snapshot ("__op" = upsert/delete)
+#   form.json              campaign form values
+#   meta.json              column order, current snapshot and its deltas
+#
+# meta.json is the commit point: it is replaced atomically and only names
+# files that were fully written. A new snapshot gets a new name, so deltas of
+# an older snapshot never apply to it, and files meta.json no longer names are
+# deleted only after it is replaced.
+#
+# Saves are debounced on a timer thread and only write the rows whose hash
+# changed. Deltas are folded back into the snapshot once there are too many,
+# so a restore is one columnar read plus at most MAX_DELTAS small ones.
+DRAFTS_DIR = os.environ.get("DRAFTS_DIR", os.path.join("data", "drafts"))
+DEBOUNCE_SECONDS = float(os.environ.get("AUTOSAVE_DEBOUNCE_SECONDS", "2"))
+MAX_DELTAS = 8
+
+ROW_COLUMN = "__row"
+OP_COLUMN = "__op"
+
+logger = logging.getLogger(__name__)
+
+
+def _user_key(user):
+    slug = re.sub(r"[^\w.-]", "_", user.strip().lower())[:40]
+    return f"{slug}-{hashlib.sha1(user.encode('utf-8')).hexdigest()[:8]}"
+
+
+def _row_hashes(df):
+    return pd.util.hash_pandas_object(df, index=True)
+
+
+class _UserDraft:
+    def __init__(self):
+        self.pending_table = None
+        self.pending_form = None
+        self.saved_hashes = None
+        self.saved_columns = None
+        self.saved_form_hash = None
+        self.timer = None
+
+
+class DraftStore:
+    def __init__(self, base_dir=DRAFTS_DIR, debounce=DEBOUNCE_SECONDS):
+        self.base_dir = base_dir
+        self.debounce = debounce
+        self._users = {}
+        self._lock = threading.RLock()
+
+    def _dir(self, user):
+        path = os.path.join(self.base_dir, _user_key(user))
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _state(self, user):
+        state = self._users.get(user)
+        if state is None:
+            state = self._users[user] = _UserDraft()
+        return state
+
+    def _read_meta(self, directory):
+        try:
+            with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"columns": None, "next_delta": 0, "deltas": [], "snapshot": None}
+
+    def _write_json(self, path, data):
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, default=str)
+        os.replace(tmp, path)
+
+    # Restore both drafts; returns (table or None, form dict)
+    def restore(self, user):
+        with self._lock:
+            directory = self._dir(user)
+            meta = self._read_meta(directory)
+            table = None
+            # Drafts from before generation-named snapshots have no "snapshot" key
+            snapshot = os.path.join(directory, meta.get("snapshot", "table.parquet") or "")
+            if os.path.isfile(snapshot):
+                try:
+                    table = pd.read_parquet(snapshot).set_index(ROW_COLUMN)
+                    table.index.name = None
+                    for name in meta["deltas"]:
+                        path = os.path.join(directory, name)
+                        if not os.path.exists(path):
+                            logger.warning("Delta %s ausente no rascunho de %s; ignorado", name, user)
+                            continue
+                        table = self._apply_delta(table, pd.read_parquet(path))
+                    if meta["columns"]:
+                        table = table.reindex(columns=meta["columns"])
+                except Exception:
+                    logger.exception("Rascunho da tabela corrompido para %s", user)
+                    table = None
+
+            form = {}
+            try:
+                with open(os.path.join(directory, "form.json"), encoding="utf-8") as f:
+                    form = json.load(f)
+            except (OSError, ValueError):
+                pass
+
+            state = self._state(user)
+            state.saved_hashes = _row_hashes(table) if table is not None else None
+            state.saved_columns = list(table.columns) if table is not None else None
+            state.saved_form_hash = hashlib.sha1(json.dumps(form, sort_keys=True, default=str).encode()).hexdigest()
+            return table, form
+
+    @staticmethod
+    def _apply_delta(table, delta):
+        delta = delta.set_index(ROW_COLUMN)
+        delta.index.name = None
+        deleted = delta.index[delta[OP_COLUMN] == "delete"]
+        upserts = delta[delta[OP_COLUMN] == "upsert"].drop(columns=[OP_COLUMN])
+        table = table.drop(index=deleted.union(upserts.index), errors="ignore")
+        if not upserts.empty:
+            table = pd.concat([table, upserts]) if not table.empty else upserts
+        return table.sort_index()
+
+    def schedule_table(self, user, df):
+        with self._lock:
+            self._state(user).pending_table = df
+            self._arm(user)
+
+    def schedule_form(self, user, form):
+        with self._lock:
+            self._state(user).pending_form = form
+            self._arm(user)
+
+    # Restart the debounce timer; only the last state within the window is written
+    def _arm(self, user):
+        state = self._state(user)
+        if state.timer is not None:
+            state.timer.cancel()
+        state.timer = threading.Timer(self.debounce, self.flush, args=(user,))
+        state.timer.daemon = True
+        state.timer.start()
+
+    def flush(self, user):
+        with self._lock:
+            state = self._state(user)
+            state.timer = None
+            table, state.pending_table = state.pending_table, None
+            form, state.pending_form = state.pending_form, None
+            try:
+                if table is not None:
+                    self._save_table(user, state, table)
+                if form is not None:
+                    self._save_form(user, state, form)
+            except Exception:
+                logger.exception("Falha no autosave do rascunho de %s", user)
+
+    def _save_form(self, user, state, form):
+        form_hash = hashlib.sha1(json.dumps(form, sort_keys=True, default=str).encode()).hexdigest()
+        if form_hash == state.saved_form_hash:
+            return
+        self._write_json(os.path.join(self._dir(user), "form.json"), form)
+        state.saved_form_hash = form_hash
+
+    def _save_table(self, user, state, df):
+        directory = self._dir(user)
+        meta = self._read_meta(directory)
+        hashes = _row_hashes(df)
+        columns = list(df.columns)
+
+        if state.saved_hashes is None or columns != state.saved_columns:
+            self._write_snapshot(directory, meta, df)
+        else:
+            previous = state.saved_hashes
+            common = hashes.index.intersection(previous.index)
+            modified = common[hashes.loc[common].to_numpy() != previous.loc[common].to_numpy()]
+            changed = hashes.index.difference(previous.index).union(modified)
+            deleted = previous.index.difference(hashes.index)
+            if len(changed) == 0 and len(deleted) == 0:
+                return
+            if len(meta["deltas"]) >= MAX_DELTAS or len(changed) + len(deleted) > len(df) // 2:
+                self._write_snapshot(directory, meta, df)
+            else:
+                upserts = df.loc[changed].copy()
+                upserts[OP_COLUMN] = "upsert"
+                deletes = pd.DataFrame({OP_COLUMN: ["delete"] * len(deleted)}, index=deleted)
+                delta = pd.concat([upserts, deletes]) if len(deleted) else upserts
+                delta.index.name = ROW_COLUMN
+                name = f"delta-{meta['next_delta']:06d}.parquet"
+                delta.reset_index().to_parquet(os.path.join(directory, name), index=False)
+                meta["deltas"].append(name)
+                meta["next_delta"] += 1
+                meta["columns"] = columns
+                self._write_json(os.path.join(directory, "meta.json"), meta)
+
+        state.saved_hashes = hashes
+        state.saved_columns = columns
+
+    def _write_snapshot(self, directory, meta, df):
+        snapshot = df.copy()
+        snapshot.index.name = ROW_COLUMN
+        generation = meta.get("generation", 0) + 1
+        name = f"table-{generation:06d}.parquet"
+        tmp = os.path.join(directory, name + ".tmp")
+        snapshot.reset_index().to_parquet(tmp, index=False)
+        os.replace(tmp, os.path.join(directory, name))
+        meta.update({"columns": list(df.columns), "deltas": [], "snapshot": name, "generation": generation, "updated": time.time()})
+        self._write_json(os.path.join(directory, "meta.json"), meta)
+        # Older snapshots and deltas, including leftovers of an interrupted save
+        for old in os.listdir(directory):
+            if old != name and old.startswith(("table", "delta-")) and ".parquet" in old:
+                try:
+                    os.remove(os.path.join(directory, old))
+                except OSError:
+                    pass
+
+    def flush_all(self):
+        with self._lock:
+            users = [user for user, state in self._users.items() if state.timer is not None]
+        for user in users:
+            self._users[user].timer.cancel()
+            self.flush(user)
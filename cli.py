@@ -0,0 +1,193 @@
+import sys
+import time
+import signal
+import argparse
+import threading
+from time import perf_counter
+
+import workers
+import scheduler
+from id_verification import IdVerifier
+from core import (
+    WEBHOOK_URL, build_ads_payload, build_campaign_payload, campaign_from_row, format_validation_error,
+    is_blocking, iter_table_chunks, lint_errors, submit_payloads, validate_ads_rows, validate_campaign, validate_geo_columns,
+    validate_media_links
+)
+
+# Headless entry point sharing the app's pipeline:
+#   python cli.py ads anuncios.csv --images "https://drive.google.com/..." --batch-size 500 --concurrency 4
+#   python cli.py campaigns campanhas.parquet --dry-run
+
+MAX_ERRORS_SHOWN = 50
+
+
+class Progress:
+    def __init__(self, total_rows, stream=sys.stderr):
+        self.total_rows = total_rows
+        self.stream = stream
+        self.rows = 0
+        self.sent = 0
+        self.failed = 0
+        self.start = perf_counter()
+        self._lock = threading.Lock()
+
+    def __call__(self, payload, success, message):
+        rows = len(payload["dados"]) if isinstance(payload["dados"], list) else 1
+        with self._lock:
+            self.rows += rows
+            if success:
+                self.sent += 1
+            else:
+                self.failed += 1
+                self.stream.write(f"\n{message}\n")
+            elapsed = perf_counter() - self.start
+            self.stream.write(
+                f"\r{self.rows}/{self.total_rows} linhas | {self.sent} envios ok | {self.failed} falhas | "
+                f"{self.rows / elapsed if elapsed else 0:.0f} linhas/s"
+            )
+            self.stream.flush()
+
+    def finish(self):
+        self.stream.write("\n")
+
+
+def report_errors(errors):
+    for error in errors[:MAX_ERRORS_SHOWN]:
+        print(format_validation_error(error), file=sys.stderr)
+    if len(errors) > MAX_ERRORS_SHOWN:
+        print(f"... e mais {len(errors) - MAX_ERRORS_SHOWN} erros", file=sys.stderr)
+
+
+def run_ads(args):
+    # Pass 1: stream the file and validate every chunk
+    total_rows = 0
+    verifier = IdVerifier()
+    errors = validate_media_links(args.images, args.thumbnail)
+    for chunk, row_errors in workers.map_chunks(validate_ads_rows, iter_table_chunks(args.input, args.batch_size)):
+        total_rows += len(chunk)
+        errors.extend(row_errors)
+        errors.extend(verifier.validate_frame(chunk))
+
+    print(f"{total_rows} anúncios lidos, {len(errors)} erros de validação", file=sys.stderr)
+    report_errors(errors)
+
+    blocking = [error for error in errors if is_blocking(error)]
+    if any(error["linha"] is None for error in blocking) or (blocking and not args.skip_invalid):
+        return 1
+    if args.dry_run or total_rows == 0:
+        return 0
+
+    # Pass 2: stream again and submit valid rows in batches
+    invalid_rows = {error["linha"] for error in blocking}
+
+    def payloads():
+        for chunk in iter_table_chunks(args.input, args.batch_size):
+            if invalid_rows:
+                chunk = chunk[~(chunk.index + 1).isin(invalid_rows)]
+            if not chunk.empty:
+                yield build_ads_payload(chunk, args.images, args.thumbnail)
+
+    progress = Progress(total_rows - len(invalid_rows))
+    sent, failed = submit_payloads(payloads(), args.webhook_url, args.concurrency, on_result=progress)
+    progress.finish()
+    print(f"{sent} lotes enviados, {failed} com falha", file=sys.stderr)
+    return 0 if failed == 0 else 2
+
+
+def run_campaigns(args):
+    total_rows = 0
+    verifier = IdVerifier()
+    errors = []
+    for chunk in iter_table_chunks(args.input, args.batch_size):
+        geo_errors = validate_geo_columns(chunk)
+        id_errors = {}
+        for error in verifier.validate_frame(chunk):
+            id_errors.setdefault(error["linha"], []).append(error)
+        copy_errors = {}
+        for _, error in lint_errors(chunk, [label + 1 for label in chunk.index.tolist()]):
+            copy_errors.setdefault(error["linha"], []).append(error)
+        for label, row in chunk.iterrows():
+            total_rows += 1
+            errors.extend(validate_campaign(campaign_from_row(row), row=label + 1, check_geo=False, check_copy=False))
+            errors.extend(copy_errors.get(label + 1, []))
+            errors.extend(geo_errors.get(label + 1, []))
+            errors.extend(id_errors.get(label + 1, []))
+
+    print(f"{total_rows} campanhas lidas, {len(errors)} erros de validação", file=sys.stderr)
+    report_errors(errors)
+
+    # Warnings (e.g. a city missing from the gazetteer, an id that could not
+    # be checked) don't block the row
+    invalid_rows = {error["linha"] for error in errors if is_blocking(error)}
+    if invalid_rows and not args.skip_invalid:
+        return 1
+    if args.dry_run or total_rows == 0:
+        return 0
+
+    # Each campaign is its own request, as on the campaign page
+    def payloads():
+        for chunk in iter_table_chunks(args.input, args.batch_size):
+            for label, row in chunk.iterrows():
+                if label + 1 not in invalid_rows:
+                    yield build_campaign_payload(campaign_from_row(row))
+
+    progress = Progress(total_rows - len(invalid_rows))
+    sent, failed = submit_payloads(payloads(), args.webhook_url, args.concurrency, on_result=progress)
+    progress.finish()
+    print(f"{sent} campanhas enviadas, {failed} com falha", file=sys.stderr)
+    return 0 if failed == 0 else 2
+
+
+# Foreground dispatcher for scheduled submissions (the "scheduler" process of
+# the Procfile and deploy/run_workers.sh; the web workers run with
+# SCHEDULER_DISPATCH=0, so jobs go out even when nobody has the app open)
+def run_scheduler(args):
+    # SIGTERM (platform restarts) stops like Ctrl+C, letting running sends finish
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    job_scheduler = scheduler.Scheduler(endpoint_url=args.webhook_url).start()
+    print(f"Agendador ativo ({job_scheduler.path}); Ctrl+C para sair", file=sys.stderr)
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        job_scheduler.stop()
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Envio em lote de anúncios e campanhas para o webhook do Meta Ads Manager")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_common(sub):
+        sub.add_argument("input", help="Arquivo CSV ou Parquet")
+        sub.add_argument("--batch-size", type=int, default=500, help="Linhas lidas (e anúncios por envio) por lote")
+        sub.add_argument("--concurrency", type=int, default=4, help="Envios simultâneos ao webhook")
+        sub.add_argument("--webhook-url", default=WEBHOOK_URL)
+        sub.add_argument("--dry-run", action="store_true", help="Apenas valida, sem enviar")
+        sub.add_argument("--skip-invalid", action="store_true", help="Envia as linhas válidas mesmo com erros em outras")
+
+    ads = subparsers.add_parser("ads", help="Criar anúncios (mesmas colunas da tabela da página Criar Anúncios)")
+    add_common(ads)
+    ads.add_argument("--images", default="", help="Links do Drive das imagens/vídeos, um por linha")
+    ads.add_argument("--thumbnail", default="", help="Link do Drive da thumbnail do vídeo")
+    ads.set_defaults(func=run_ads)
+
+    campaigns = subparsers.add_parser("campaigns", help="Criar campanhas (uma campanha por linha)")
+    add_common(campaigns)
+    campaigns.set_defaults(func=run_campaigns)
+
+    dispatcher = subparsers.add_parser("scheduler", help="Despacha os envios agendados (página Agendamentos)")
+    dispatcher.add_argument("--webhook-url", default=WEBHOOK_URL)
+    dispatcher.set_defaults(func=run_scheduler)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,492 @@
+import os
+import re
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from time import perf_counter
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import pandas as pd
+import requests
+import urllib3
+
+import geo
+import perf
+import copy_lint
+import workers
+import preview
+import audit_log
+import wire
+
+# Shared pipeline for the Streamlit pages and the CLI: payload building,
+# validation and delivery to the n8n webhook. Nothing here imports streamlit.
+WEBHOOK_URL = os.environ.get(
+    "WEBHOOK_URL",
+    "https://ferrazpiai-n8n-editor.uyk8ty.easypanel.host/webhook-test/e78ecade-5474-4877-93a6-f91980088282"
+)
+
+# Operators' timezone: scheduled times are typed and shown in it, whatever
+# timezone the server runs in (the deployment is UTC, the operators are not)
+APP_TZ = ZoneInfo(os.environ.get("APP_TZ", "America/Sao_Paulo"))
+
+# (connect, read) timeouts for the webhook; without them a stalled endpoint
+# holds a worker forever
+WEBHOOK_TIMEOUT = (
+    float(os.environ.get("WEBHOOK_CONNECT_TIMEOUT_SECONDS", "10")),
+    float(os.environ.get("WEBHOOK_TIMEOUT_SECONDS", "60")),
+)
+
+ADS_COLUMNS = [
+    "ID Adset", "Nome Anúncio", "Tipo de Anúncio", "ID da Página do Facebook",
+    "Status do Anúncio", "Link de Destino", "Texto do Anúncio",
+    "Call to Action (CTA)", "BM Conectada", "ID Conta de Anúncios"
+]
+
+# Meta ids (up to 18 digits) don't fit exactly in a float64, so id columns are
+# kept as text from the file to the payload
+ID_COLUMNS = [
+    "ID Adset", "ID da Página do Facebook", "ID Conta de Anúncios",
+    "ID da Página", "ID da Conta de Anúncios"
+]
+
+# Largest integer a float64 holds exactly
+MAX_EXACT_FLOAT = 2 ** 53
+
+CAMPAIGN_REQUIRED_FIELDS = [
+    "ID da Página", "ID da Conta de Anúncios", "Nome da Campanha", "Nome do Ad Set",
+    "Nome do Anúncio", "Link de Destino", "Texto do Anúncio"
+]
+
+URL_PATTERN = re.compile(
+    r'^https?://'  # http:// or https://
+    r'(?:(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+[A-Z]{2,6}\.?|'  # domain...
+    r'localhost|'  # localhost...
+    r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})'  # ...or ip
+    r'(?::\d+)?'  # optional port
+    r'(?:/?|[/?]\S+)$', re.IGNORECASE)
+
+DRIVE_URL_PATTERN = re.compile(
+    r'^https?://'  # http:// ou https://
+    r'(?:www\.)?'  # opcional www
+    r'drive\.google\.com'  # domínio fixo do Google Drive
+    r'(?:/[\w\-./?=&%]*)?$',  # caminhos e parâmetros permitidos
+    re.IGNORECASE
+)
+
+# Targeting fields resolved against the local gazetteer, with the payload key
+# that receives the canonical ids. An unknown city is only a warning because
+# the bundled municipality list may be partial (see _geo_error). States and
+# cities are only resolved for Brazil (see geo.covers_countries).
+COUNTRY_FIELD = "País (BR, EUA...)"
+GEO_FIELDS = [
+    (COUNTRY_FIELD, geo.COUNTRY, "País ID", "erro"),
+    ("Estado (SP, AL, MT...)", geo.STATE, "Estado ID", "erro"),
+    ("Cidade", geo.CITY, "Cidade ID", "aviso"),
+]
+
+
+# Function to get the current time in the operators' timezone
+def local_now():
+    return datetime.now(APP_TZ)
+
+
+# Function to turn epoch milliseconds into an operator-timezone datetime
+def from_ms(ms):
+    return datetime.fromtimestamp(ms / 1000, APP_TZ)
+
+
+# Function to validate URL
+def is_valid_url(url):
+    if not url:
+        return False
+    return URL_PATTERN.match(url) is not None
+
+
+def is_valid_driveurl(url):
+    if not url:
+        return False
+    return DRIVE_URL_PATTERN.match(url)
+
+
+# Function to split a multi-line text area into a list of links
+def parse_links(text):
+    return [link.strip() for link in text.split('\n') if link.strip()] if text else []
+
+
+# Validation errors are dicts so the UI and the CLI can render them either as
+# the familiar "❌ Linha N: ..." lines or as a table. Only "erro" blocks a
+# submission; "aviso" is shown but lets it through.
+def validation_error(row, field, message, code, severity="erro"):
+    return {"linha": row, "campo": field, "erro": message, "codigo": code, "severidade": severity}
+
+
+def is_blocking(error):
+    return error.get("severidade", "erro") == "erro"
+
+
+def format_validation_error(error):
+    icon = "❌" if is_blocking(error) else "⚠️"
+    if error["linha"] is None:
+        return f"{icon} {error['erro']}"
+    return f"{icon} Linha {error['linha']}: {error['erro']}"
+
+
+# Validate the ads table column by column; errors come back in row order.
+# Row numbers are the index labels + 1, so chunks read with a running index
+# keep their position in the original file.
+def validate_ads_rows(df):
+    if df.empty:
+        return []
+    row_numbers = [label + 1 if isinstance(label, int) else label for label in df.index.tolist()]
+    found = []
+    columns = list(df.columns)
+    for order, col in enumerate(columns):
+        values = df[col]
+        missing = values.isna() | (values.astype(object) == "")
+        for position in missing.to_numpy().nonzero()[0]:
+            found.append((position, order, validation_error(row_numbers[position], col, f"{col} é obrigatório", "obrigatorio")))
+
+    if "Link de Destino" in df.columns:
+        links = df["Link de Destino"]
+        present = links.notna() & (links.astype(object) != "")
+        invalid = present & ~links.astype(str).map(is_valid_url)
+        for position in invalid.to_numpy().nonzero()[0]:
+            found.append((position, len(columns), validation_error(
+                row_numbers[position], "Link de Destino", "Link de Destino deve ser uma URL válida", "url_invalida")))
+
+    for col in ADS_COLUMNS:
+        if col not in df.columns:
+            found.append((-1, 0, validation_error(None, col, f"Coluna obrigatória ausente: {col}", "coluna_ausente")))
+
+    found.extend((position, len(columns) + 1, error) for position, error in lint_errors(df, row_numbers))
+
+    found.sort(key=lambda item: (item[0], item[1]))
+    return [error for _, _, error in found]
+
+
+# Copy lint findings (length, characters, banned terms, repeated copy) as
+# (position, validation_error) pairs
+def lint_errors(df, row_numbers):
+    errors = []
+    for position, field, message, code, severity, other in copy_lint.lint_frame(df):
+        if other is not None:
+            message += f" (igual à linha {row_numbers[other]})"
+        errors.append((position, validation_error(row_numbers[position], field, message, code, severity)))
+    return errors
+
+
+# Validate a stream of chunks, yielding a running summary after each one.
+# Only the first max_kept errors are kept; the rest are just counted, so
+# memory stays bounded by the chunk size.
+def stream_ads_validation(chunks, max_kept=1000):
+    summary = {"linhas": 0, "erros": 0, "bloqueantes": 0, "linhas_com_erro": 0, "por_campo": {}, "amostra": []}
+    missing_columns_seen = False
+    # Chunks are validated in the process pool when VALIDATION_PROCESSES is set
+    for chunk, errors in workers.map_chunks(validate_ads_rows, chunks):
+        if missing_columns_seen:
+            errors = [error for error in errors if error["codigo"] != "coluna_ausente"]
+        missing_columns_seen = missing_columns_seen or any(error["codigo"] == "coluna_ausente" for error in errors)
+
+        summary["linhas"] += len(chunk)
+        summary["erros"] += len(errors)
+        summary["bloqueantes"] += sum(1 for error in errors if is_blocking(error))
+        summary["linhas_com_erro"] += len({error["linha"] for error in errors if error["linha"] is not None})
+        for error in errors:
+            summary["por_campo"][error["campo"]] = summary["por_campo"].get(error["campo"], 0) + 1
+        room = max_kept - len(summary["amostra"])
+        if room > 0:
+            summary["amostra"].extend(errors[:room])
+        yield summary
+
+
+def validate_media_links(image_links, thumbnail_link):
+    errors = []
+    if image_links:
+        for line_num, link in enumerate(image_links.strip().split('\n'), 1):
+            if link.strip() and not is_valid_driveurl(link.strip()):
+                errors.append(validation_error(None, "Imagens", f"Link de Imagem linha {line_num}: URL inválida || Verifique se o link da imagem é de um drive", "link_midia"))
+
+    if thumbnail_link and not is_valid_driveurl(thumbnail_link.strip()):
+        errors.append(validation_error(None, "Thumbnail (Video)", "Link de Thumbnail: URL inválida || Faça upload da Imagem no google Drive", "link_midia"))
+    return errors
+
+
+def validate_ads(df, image_links, thumbnail_link):
+    return validate_ads_rows(df) + validate_media_links(image_links, thumbnail_link)
+
+
+# check_geo / check_copy=False leave those checks to the bulk variants
+# (validate_geo_columns, lint_errors over the whole chunk)
+def validate_campaign(campaign, row=None, check_geo=True, check_copy=True):
+    errors = [
+        validation_error(row, field, f"{field} é obrigatório", "obrigatorio")
+        for field in CAMPAIGN_REQUIRED_FIELDS
+        if not _present(campaign.get(field))
+    ]
+    destination_link = campaign.get("Link de Destino")
+    if _present(destination_link) and not is_valid_url(str(destination_link)):
+        errors.append(validation_error(row, "Link de Destino", "Link de Destino deve ser uma URL válida começando com http:// ou https://", "url_invalida"))
+    if check_copy:
+        errors += [error for _, error in lint_errors(pd.DataFrame([campaign]), [row])]
+    return (errors + validate_geo(campaign, row)) if check_geo else errors
+
+
+def _geo_state(campaign, gazetteer):
+    return geo.single_state(gazetteer, campaign.get("Estado (SP, AL, MT...)"))
+
+
+# Check every targeting value against the gazetteer, suggesting the closest
+# names when one is not found
+def validate_geo(campaign, row=None):
+    gazetteer = geo.load_gazetteer()
+    state = _geo_state(campaign, gazetteer)
+    brazil = geo.covers_countries(gazetteer, campaign.get(COUNTRY_FIELD))
+    errors = []
+    for field, kind, _, severity in GEO_FIELDS:
+        if kind != geo.COUNTRY and not brazil:
+            continue
+        for result in gazetteer.resolve_field(kind, campaign.get(field), state):
+            if result.entry is not None:
+                continue
+            errors.append(_geo_error(row, field, kind, severity, result, gazetteer))
+    return errors
+
+
+# Against a partial list (the bundled municipios.csv sample) a missing value
+# may well be valid: it is reported as not verified rather than not found
+def _geo_error(row, field, kind, severity, result, gazetteer):
+    if gazetteer.complete[kind]:
+        return validation_error(row, field, _geo_message(field, result), "geo_desconhecido", severity)
+    message = f"{field}: '{result.text}' não consta na lista local (parcial) e não foi verificado"
+    if result.suggestions:
+        message += f"; confira se não é {', '.join(geo.describe(entry) for entry in result.suggestions)}"
+    return validation_error(row, field, message, "geo_nao_verificado", "aviso")
+
+
+def _geo_message(field, result):
+    message = f"{field}: '{result.text}' não encontrado"
+    if result.suggestions:
+        message += f" (você quis dizer {', '.join(geo.describe(entry) for entry in result.suggestions)}?)"
+    return message
+
+
+# Bulk variant for a chunk of a campaign upload: each distinct value of a geo
+# column is resolved once. Returns {row number: [errors]}.
+def validate_geo_columns(chunk):
+    gazetteer = geo.load_gazetteer()
+    row_numbers = [label + 1 for label in chunk.index.tolist()]
+    states = chunk["Estado (SP, AL, MT...)"].tolist() if "Estado (SP, AL, MT...)" in chunk.columns else None
+    brazil = [True] * len(chunk)
+    if COUNTRY_FIELD in chunk.columns:
+        cache = {}
+        countries = [value if isinstance(value, str) else None for value in chunk[COUNTRY_FIELD].tolist()]
+        for value in countries:
+            if value not in cache:
+                cache[value] = geo.covers_countries(gazetteer, value)
+        brazil = [cache[value] for value in countries]
+    errors = {}
+    for field, kind, _, severity in GEO_FIELDS:
+        if field not in chunk.columns:
+            continue
+        values = chunk[field].tolist()
+        if kind != geo.COUNTRY:
+            values = [value if local else None for value, local in zip(values, brazil)]
+        for row, results in zip(row_numbers, gazetteer.resolve_column(kind, values, states)):
+            for result in results:
+                if result.entry is None:
+                    errors.setdefault(row, []).append(
+                        _geo_error(row, field, kind, severity, result, gazetteer))
+    return errors
+
+
+# Replace the free-text targeting values by their canonical form and add the
+# matching id lists; unresolved values are passed through unchanged
+def canonicalize_geo(campaign):
+    gazetteer = geo.load_gazetteer()
+    state = _geo_state(campaign, gazetteer)
+    brazil = geo.covers_countries(gazetteer, campaign.get(COUNTRY_FIELD))
+    campaign = dict(campaign)
+    for field, kind, id_field, _ in GEO_FIELDS:
+        if kind != geo.COUNTRY and not brazil:
+            continue
+        results = gazetteer.resolve_field(kind, campaign.get(field), state)
+        if not results:
+            continue
+        campaign[field] = ", ".join(geo.canonical_text(result.entry) if result.entry else result.text for result in results)
+        campaign[id_field] = [result.entry.id for result in results if result.entry is not None]
+    return campaign
+
+
+def _present(value):
+    if value is None:
+        return False
+    if isinstance(value, float) and value != value:
+        return False
+    return bool(value)
+
+
+# Read a CSV or Parquet file in chunks with a running index, so peak memory
+# follows the chunk size instead of the file size
+def iter_table_chunks(path_or_buffer, chunksize, file_format=None):
+    name = getattr(path_or_buffer, "name", path_or_buffer)
+    file_format = file_format or ("parquet" if str(name).lower().endswith((".parquet", ".pq")) else "csv")
+    if file_format == "parquet":
+        import pyarrow.parquet as pq
+        offset = 0
+        for batch in pq.ParquetFile(path_or_buffer).iter_batches(batch_size=chunksize):
+            chunk = batch.to_pandas()
+            chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+            offset += len(chunk)
+            yield chunk
+    else:
+        yield from pd.read_csv(path_or_buffer, chunksize=chunksize, dtype={column: str for column in ID_COLUMNS})
+
+
+# Text form of an id cell; floats past 2**53 keep their float text, which
+# fails the id format check instead of passing with rounded digits
+def id_as_text(value):
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    if isinstance(value, float) and value.is_integer() and abs(value) <= MAX_EXACT_FLOAT:
+        return str(int(value))
+    return str(value)
+
+
+# Function to turn the id columns of a table (e.g. a numeric parquet or an
+# older draft) into text, as the table editor expects
+def ids_as_text(df):
+    columns = [column for column in ID_COLUMNS if column in df.columns]
+    if not columns:
+        return df
+    df = df.copy()
+    for column in columns:
+        df[column] = df[column].map(id_as_text).astype(object)
+    return df
+
+
+# Turn a campaign table row into the same dict the campaign page builds
+def campaign_from_row(row):
+    campaign = {key: (None if isinstance(value, float) and value != value else value) for key, value in row.items()}
+    images = campaign.get("Imagens")
+    campaign["Imagens"] = parse_links(images.replace("|", "\n")) if isinstance(images, str) else images or []
+    thumbnail = campaign.get("Thumbnail (Video)")
+    campaign["Thumbnail (Video)"] = thumbnail.strip() if isinstance(thumbnail, str) else ""
+    return campaign
+
+
+def build_ads_payload(ads_df, image_links, thumbnail_link):
+    ads_data = ads_df.to_dict('records')
+
+    # Add image and thumbnail links
+    image_urls = parse_links(image_links)
+    thumbnail_url = thumbnail_link.strip() if thumbnail_link else ""
+
+    for ad in ads_data:
+        ad["Imagens"] = image_urls
+        ad["Thumbnail (Video)"] = thumbnail_url
+        ad["SubmissionTime"] = str(datetime.now())
+
+    return {
+        "tipo_requisicao": "criar_anuncio",
+        "dados": ads_data,
+        "timestamp": str(datetime.now())
+    }
+
+
+def build_campaign_payload(campaign_data):
+    return {
+        "tipo_requisicao": "criar_campanha",
+        "dados": {**canonicalize_geo(campaign_data), "SubmissionTime": str(datetime.now())},
+        "timestamp": str(datetime.now())
+    }
+
+
+# Whether a failed request certainly never reached n8n: the connection was
+# never established, or a proxy answered 5xx without a body. The webhook is
+# not idempotent (it creates campaigns, ad sets and ads in Meta), so only
+# these failures are safe to send again automatically; after a read timeout
+# or a dropped connection n8n may already have processed the body.
+def _retry_safe(error=None, response=None):
+    if response is not None:
+        return response.status_code >= 500 and not response.content.strip()
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError) and error.args:
+        reason = getattr(error.args[0], "reason", None)
+        return isinstance(reason, (urllib3.exceptions.NewConnectionError, urllib3.exceptions.ConnectTimeoutError))
+    return False
+
+
+# Function to send data to webhook; returns (success, message, retry_safe)
+def deliver_to_webhook(data, endpoint_url=WEBHOOK_URL):
+    page = data.get("tipo_requisicao", "") if isinstance(data, dict) else ""
+    start = perf_counter()
+    body = b""
+    status_code = 0
+    success = False
+    retry_safe = False
+    message = ""
+    try:
+        with perf.timed("serialization", page=page):
+            # Plain JSON unless WEBHOOK_FORMAT / WEBHOOK_COMPRESSION say otherwise (see wire.py)
+            body, headers = wire.encode(data)
+        start = perf_counter()
+        response = requests.post(
+            endpoint_url,
+            data=body,
+            headers=headers,
+            timeout=WEBHOOK_TIMEOUT
+        )
+        status_code = response.status_code
+        if response.status_code == 200:
+            success = True
+            message = "Dados enviados com sucesso!"
+        else:
+            message = f"Erro: {response.status_code} - {response.text}"
+            retry_safe = _retry_safe(response=response)
+    except Exception as e:
+        message = f"Erro: {str(e)}"
+        retry_safe = _retry_safe(error=e)
+    latency = perf_counter() - start
+    perf.record("webhook", latency, page=page, ok=success)
+    submission_id = audit_log.safe_record_submission(data, body, latency, status_code, success, message)
+    # The per-account snapshot (O(rows)) is written in the background
+    if success and submission_id is not None:
+        preview.schedule_snapshots(data, submission_id)
+    return success, message, retry_safe
+
+
+def send_to_webhook(data, endpoint_url=WEBHOOK_URL):
+    success, message, _ = deliver_to_webhook(data, endpoint_url)
+    return success, message
+
+
+# Send payloads with at most `concurrency` requests in flight. The iterable is
+# consumed lazily, so large batches are never fully materialized.
+# on_result(payload, success, message) is called as each request finishes.
+def submit_payloads(payloads, endpoint_url=WEBHOOK_URL, concurrency=4, on_result=None):
+    sent = failed = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = {}
+        payloads = iter(payloads)
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < concurrency * 2:
+                try:
+                    payload = next(payloads)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending[executor.submit(send_to_webhook, payload, endpoint_url)] = payload
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                payload = pending.pop(future)
+                success, message = future.result()
+                if success:
+                    sent += 1
+                else:
+                    failed += 1
+                if on_result:
+                    on_result(payload, success, message)
+    return sent, failed
@@ -0,0 +1,43 @@
+#!/bin/sh
+# Multi-process mode: WORKERS Streamlit processes on BASE_PORT, BASE_PORT+1, ...
+# behind a load balancer with sticky sessions (see deploy/nginx.conf). A
+# session lives in one worker (its tables, its websocket); what must agree
+# across workers is kept in SQLite files (WAL) under SHARED_DIR:
+#   audit.sqlite3     submission log and per-account snapshots
+#   id_cache.sqlite3  verified page / ad account / ad set ids
+#   scheduler.sqlite3 scheduled submissions, dispatched by one "cli.py
+#                     scheduler" process started here (the web workers run
+#                     with SCHEDULER_DISPATCH=0)
+#   drafts/           autosaved drafts (one operator per worker at a time)
+# Big table validations run in VALIDATION_PROCESSES helper processes per worker.
+#
+#   STREAMLIT_SERVER_COOKIE_SECRET=... WORKERS=4 deploy/run_workers.sh
+set -e
+
+WORKERS=${WORKERS:-4}
+BASE_PORT=${BASE_PORT:-8501}
+SHARED_DIR=${SHARED_DIR:-data}
+
+export AUDIT_DB_PATH=${AUDIT_DB_PATH:-$SHARED_DIR/audit.sqlite3}
+export ID_CACHE_DB_PATH=${ID_CACHE_DB_PATH:-$SHARED_DIR/id_cache.sqlite3}
+export SCHEDULER_DB_PATH=${SCHEDULER_DB_PATH:-$SHARED_DIR/scheduler.sqlite3}
+export DRAFTS_DIR=${DRAFTS_DIR:-$SHARED_DIR/drafts}
+export VALIDATION_PROCESSES=${VALIDATION_PROCESSES:-2}
+# Timezone the operators schedule in (the servers run in UTC)
+export APP_TZ=${APP_TZ:-America/Sao_Paulo}
+# Same cookie secret everywhere, so a session that moves after a worker
+# restart keeps a valid XSRF cookie
+: "${STREAMLIT_SERVER_COOKIE_SECRET:?defina STREAMLIT_SERVER_COOKIE_SECRET (igual em todos os processos)}"
+export STREAMLIT_SERVER_COOKIE_SECRET
+
+mkdir -p "$SHARED_DIR"
+trap 'kill 0' INT TERM EXIT
+
+python cli.py scheduler &
+
+i=0
+while [ "$i" -lt "$WORKERS" ]; do
+    SCHEDULER_DISPATCH=0 streamlit run app.py --server.port=$((BASE_PORT + i)) --server.headless=true --server.enableCORS=false &
+    i=$((i + 1))
+done
+wait
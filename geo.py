@@ -0,0 +1,193 @@
+import os
+import re
+import csv
+import difflib
+import unicodedata
+from functools import lru_cache
+from collections import namedtuple
+
+# Local gazetteer for the targeting fields: ISO countries, Brazilian states
+# (UF) and municipalities (IBGE codes), bundled as CSVs in gazetteer/.
+# municipios.csv ships with capitals and large cities; replace it with the full
+# IBGE table (same ibge,nome,uf columns) to cover every municipality. Until
+# then a city that is not in the file is "not verified", not unknown.
+GAZETTEER_DIR = os.environ.get("GAZETTEER_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "gazetteer"))
+
+COUNTRY = "pais"
+STATE = "estado"
+CITY = "cidade"
+
+# Brazil has ~5,570 municipalities; a smaller municipios.csv is a sample
+FULL_MUNICIPALITY_COUNT = 5500
+
+# id: canonical id sent in the payload (ISO alpha-2, UF, IBGE code)
+GeoEntry = namedtuple("GeoEntry", ["kind", "id", "name", "parent"])
+GeoResult = namedtuple("GeoResult", ["text", "entry", "suggestions"])
+
+_SEPARATORS = re.compile(r"[;,/]")
+
+
+def fold(text):
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return " ".join(text.split())
+
+
+def split_values(text):
+    if text is None or (isinstance(text, float) and text != text):
+        return []
+    return [part.strip() for part in _SEPARATORS.split(str(text)) if part.strip()]
+
+
+class _Trie:
+    __slots__ = ("root",)
+
+    def __init__(self):
+        self.root = {}
+
+    def insert(self, key, value):
+        node = self.root
+        for ch in key:
+            node = node.setdefault(ch, {})
+        node.setdefault(None, []).append(value)
+
+    def prefixed(self, prefix, limit):
+        node = self.root
+        for ch in prefix:
+            node = node.get(ch)
+            if node is None:
+                return []
+        found = []
+        stack = [node]
+        # Breadth-first by key length keeps shorter (closer) matches first
+        while stack and len(found) < limit:
+            next_level = []
+            for current in stack:
+                for value in current.get(None, ()):
+                    if value not in found:
+                        found.append(value)
+                for ch in sorted(k for k in current if k is not None):
+                    next_level.append(current[ch])
+            stack = next_level
+        return found[:limit]
+
+
+class Gazetteer:
+    def __init__(self):
+        self.entries = []
+        # (kind, folded key) -> entries; homonym cities share a key
+        self._exact = {}
+        self._tries = {COUNTRY: _Trie(), STATE: _Trie(), CITY: _Trie()}
+        self._keys = {COUNTRY: [], STATE: [], CITY: []}
+        # Whether a value missing from a kind's list can be called unknown
+        self.complete = {COUNTRY: True, STATE: True, CITY: True}
+
+    def add(self, entry, keys):
+        self.entries.append(entry)
+        for key in {fold(k) for k in keys if k}:
+            self._exact.setdefault((entry.kind, key), []).append(entry)
+            self._tries[entry.kind].insert(key, entry)
+            self._keys[entry.kind].append(key)
+
+    # Exact (accent/case-insensitive) match; for cities `state` disambiguates
+    # homonyms such as "São José" (SC) and other states. A homonym in another
+    # state is a different municipality, so it is never returned for `state`.
+    def lookup(self, kind, text, state=None):
+        matches = self._exact.get((kind, fold(text)), [])
+        if state and kind == CITY:
+            matches = [entry for entry in matches if entry.parent == state]
+        return matches[0] if matches else None
+
+    def suggest(self, kind, prefix, limit=8, state=None):
+        entries = self._tries[kind].prefixed(fold(prefix), limit * 4 if state else limit)
+        if state and kind == CITY:
+            entries = sorted(entries, key=lambda entry: entry.parent != state)
+        return entries[:limit]
+
+    # Typo-tolerant fallback used when neither exact nor prefix match works
+    def closest(self, kind, text, limit=3):
+        keys = difflib.get_close_matches(fold(text), self._keys[kind], n=limit, cutoff=0.75)
+        found = []
+        for key in keys:
+            for entry in self._exact[(kind, key)]:
+                if entry not in found:
+                    found.append(entry)
+        return found[:limit]
+
+    def resolve(self, kind, text, state=None):
+        entry = self.lookup(kind, text, state)
+        if entry is not None:
+            return GeoResult(text, entry, [])
+        suggestions = self.suggest(kind, text, limit=3, state=state) or self.closest(kind, text)
+        return GeoResult(text, None, suggestions)
+
+    # Resolve a comma-separated field ("SP, RJ") into one result per value
+    def resolve_field(self, kind, text, state=None):
+        return [self.resolve(kind, value, state) for value in split_values(text)]
+
+    # Bulk resolution for a column of a batch upload: each distinct value is
+    # resolved once and the results are mapped back onto the rows
+    def resolve_column(self, kind, values, states=None):
+        states = list(states) if states is not None else [None] * len(values)
+        cache = {}
+        results = []
+        for value, state in zip(values, states):
+            key = (value if isinstance(value, str) else None, state)
+            if key not in cache:
+                cache[key] = self.resolve_field(kind, value, single_state(self, state))
+            results.append(cache[key])
+        return results
+
+
+# States and cities in the gazetteer are Brazilian, so they are only looked up
+# when the countries are Brazil or not given; for other countries they go out
+# as typed
+def covers_countries(gazetteer, country_text):
+    for value in split_values(country_text):
+        entry = gazetteer.lookup(COUNTRY, value)
+        if entry is None or entry.id != "BR":
+            return False
+    return True
+
+
+def single_state(gazetteer, state_text):
+    # Only a single resolvable state can scope a city lookup
+    values = split_values(state_text)
+    if len(values) != 1:
+        return None
+    entry = gazetteer.lookup(STATE, values[0])
+    return entry.id if entry else None
+
+
+def _read_csv(path):
+    with open(path, encoding="utf-8", newline="") as f:
+        return list(csv.DictReader(f))
+
+
+@lru_cache(maxsize=4)
+def load_gazetteer(directory=GAZETTEER_DIR):
+    gazetteer = Gazetteer()
+    for row in _read_csv(os.path.join(directory, "paises.csv")):
+        aliases = row.get("aliases", "").split("|")
+        gazetteer.add(GeoEntry(COUNTRY, row["iso2"], row["nome"], None),
+                      [row["iso2"], row["iso3"], row["nome"], row["nome_en"]] + aliases)
+    for row in _read_csv(os.path.join(directory, "estados.csv")):
+        gazetteer.add(GeoEntry(STATE, row["uf"], row["nome"], "BR"), [row["uf"], row["nome"]])
+    cities = _read_csv(os.path.join(directory, "municipios.csv"))
+    for row in cities:
+        gazetteer.add(GeoEntry(CITY, row["ibge"], row["nome"], row["uf"]), [row["nome"]])
+    gazetteer.complete[CITY] = len(cities) >= FULL_MUNICIPALITY_COUNT
+    return gazetteer
+
+
+# Text written back into the form field: the field labels ask for codes
+# ("SP, AL", "BR, EUA") for states and countries, names for cities
+def canonical_text(entry):
+    return entry.name if entry.kind == CITY else entry.id
+
+
+def describe(entry):
+    if entry.kind == CITY:
+        return f"{entry.name} - {entry.parent}"
+    return f"{entry.name} ({entry.id})"
@@ -0,0 +1,398 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+import requests
+
+import perf
+from core import MAX_EXACT_FLOAT, validation_error
+
+# Verification of the Meta ids typed into the pages (page, ad account, ad
+# set). The distinct ids of a table are checked in one batch against a
+# pluggable backend and the answers are cached process-wide with TTL + LRU,
+# so only ids never seen before (or expired) cost a lookup.
+#
+# ID_VERIFICATION_BACKEND selects the backend:
+#   formato  (default) offline shape checks only
+#   graph    Meta Graph API lookups (META_ACCESS_TOKEN, META_GRAPH_URL), on top of the shape checks
+#   stub     known ids from the JSON file in ID_VERIFICATION_STUB_FILE
+ID_VERIFICATION_BACKEND = os.environ.get("ID_VERIFICATION_BACKEND", "graph" if os.environ.get("META_ACCESS_TOKEN") else "formato")
+CACHE_SIZE = int(os.environ.get("ID_CACHE_SIZE", "50000"))
+CACHE_TTL_SECONDS = int(os.environ.get("ID_CACHE_TTL_SECONDS", str(24 * 60 * 60)))
+# Ids that failed are rechecked sooner: they are often fixed on Meta's side
+NEGATIVE_TTL_SECONDS = int(os.environ.get("ID_CACHE_NEGATIVE_TTL_SECONDS", str(10 * 60)))
+# Set to share the cache between processes (several Streamlit workers, the
+# CLI) through a SQLite file in WAL mode; unset keeps it in process memory
+CACHE_DB_PATH = os.environ.get("ID_CACHE_DB_PATH")
+
+PAGE = "pagina"
+AD_ACCOUNT = "conta"
+ADSET = "adset"
+
+# Table/form fields holding each kind of id
+ID_FIELDS = {
+    "ID da Página do Facebook": PAGE,
+    "ID da Página": PAGE,
+    "ID Conta de Anúncios": AD_ACCOUNT,
+    "ID da Conta de Anúncios": AD_ACCOUNT,
+    "ID Adset": ADSET,
+}
+
+# ok: True valid, False invalid, None could not be checked (not cached)
+IdStatus = namedtuple("IdStatus", ["ok", "reason", "name"])
+
+logger = logging.getLogger(__name__)
+
+
+# Canonical text form of an id; returns (id, problem)
+def normalize_id(kind, value):
+    if value is None or (isinstance(value, float) and value != value):
+        return None, None
+    if isinstance(value, float):
+        if not value.is_integer():
+            return str(value), "não é um número inteiro"
+        if abs(value) > MAX_EXACT_FLOAT:
+            return f"{int(value)}", "número grande demais para coluna numérica (use texto); dígitos finais podem ter sido perdidos"
+        value = int(value)
+    text = str(value).strip()
+    if kind == AD_ACCOUNT and text.lower().startswith("act_"):
+        if not text[4:].strip():
+            return text, "falta o número da conta depois de act_"
+        text = text[4:].strip()
+    # Blank cells (e.g. only spaces) count as missing, like empty ones
+    return text or None, None
+
+
+class FormatBackend:
+    # Meta ids are positive integers of (today) 5 to 20 digits
+    PATTERN = re.compile(r"^[1-9]\d{4,19}$")
+    batch_size = 10000
+
+    def verify(self, kind, ids):
+        return {
+            id_: IdStatus(True, "", None) if self.PATTERN.match(id_) else IdStatus(False, "formato inválido", None)
+            for id_ in ids
+        }
+
+
+class StubBackend(FormatBackend):
+    # known: {kind: {id: name}}; anything else with a valid shape is unknown
+    def __init__(self, known):
+        self.known = {kind: {str(id_): name for id_, name in ids.items()} for kind, ids in known.items()}
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def verify(self, kind, ids):
+        results = super().verify(kind, ids)
+        known = self.known.get(kind, {})
+        for id_, status in results.items():
+            if status.ok:
+                results[id_] = IdStatus(True, "", known[id_]) if id_ in known else IdStatus(False, "não encontrado", None)
+        return results
+
+
+class GraphBackend(FormatBackend):
+    # GET /?ids=a,b,c answers several objects per request (up to 50)
+    batch_size = 50
+
+    def __init__(self, access_token, base_url=None, timeout=10):
+        self.access_token = access_token
+        self.base_url = base_url or os.environ.get("META_GRAPH_URL", "https://graph.facebook.com/v19.0/")
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def verify(self, kind, ids):
+        results = super().verify(kind, ids)
+        pending = [id_ for id_, status in results.items() if status.ok]
+        for start in range(0, len(pending), self.batch_size):
+            results.update(self._lookup(kind, pending[start:start + self.batch_size]))
+        return results
+
+    def _lookup(self, kind, ids, retry=True):
+        graph_ids = {f"act_{id_}" if kind == AD_ACCOUNT else id_: id_ for id_ in ids}
+        try:
+            response = self.session.get(
+                self.base_url,
+                params={"ids": ",".join(graph_ids), "fields": "id,name", "access_token": self.access_token},
+                timeout=self.timeout,
+            )
+            data = response.json()
+        except (requests.RequestException, ValueError) as e:
+            return {id_: IdStatus(None, f"não verificado ({e.__class__.__name__})", None) for id_ in ids}
+
+        if response.status_code == 200:
+            return {
+                id_: IdStatus(True, "", data[graph_id].get("name")) if graph_id in data else IdStatus(False, "não encontrado", None)
+                for graph_id, id_ in graph_ids.items()
+            }
+
+        # One unknown id fails the whole batch, naming the missing aliases;
+        # mark those and ask again for the rest
+        message = data.get("error", {}).get("message", "") if isinstance(data, dict) else ""
+        match = re.search(r"do not exist: (.+)$", message)
+        if retry and match:
+            missing = {alias.strip() for alias in match.group(1).split(",")}
+            results = {graph_ids[alias]: IdStatus(False, "não encontrado", None) for alias in missing if alias in graph_ids}
+            rest = [id_ for graph_id, id_ in graph_ids.items() if graph_id not in missing]
+            if rest:
+                results.update(self._lookup(kind, rest, retry=False))
+            return results
+        return {id_: IdStatus(None, f"não verificado (HTTP {response.status_code})", None) for id_ in ids}
+
+
+def make_backend(name=None):
+    name = name or ID_VERIFICATION_BACKEND
+    if name == "graph":
+        token = os.environ.get("META_ACCESS_TOKEN")
+        if token:
+            return GraphBackend(token)
+        logger.warning("ID_VERIFICATION_BACKEND=graph sem META_ACCESS_TOKEN; usando apenas o formato")
+    elif name == "stub":
+        path = os.environ.get("ID_VERIFICATION_STUB_FILE")
+        if path:
+            return StubBackend.from_file(path)
+        return StubBackend({})
+    return FormatBackend()
+
+
+class IdCache:
+    # LRU ordered dict of key -> (expires_at, value); thread-safe
+    def __init__(self, maxsize=CACHE_SIZE, ttl=CACHE_TTL_SECONDS, negative_ttl=NEGATIVE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for key in keys:
+                item = self._data.get(key)
+                if item is None or item[0] < now:
+                    if item is not None:
+                        del self._data[key]
+                    self.misses += 1
+                    continue
+                self._data.move_to_end(key)
+                found[key] = item[1]
+                self.hits += 1
+        return found
+
+    def put_many(self, items):
+        now = time.monotonic()
+        with self._lock:
+            for key, status in items.items():
+                # Lookups that could not run are retried next time
+                if status.ok is None:
+                    continue
+                self._data[key] = (now + (self.ttl if status.ok else self.negative_ttl), status)
+                self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SqliteIdCache:
+    # Same interface as IdCache, stored in a SQLite table every process reads
+    # and writes. Expiry uses wall-clock time (monotonic clocks differ between
+    # processes); past maxsize the entries closest to expiring go first, which
+    # approximates LRU without a write per hit. hits/misses are per process.
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS id_cache (
+        kind TEXT NOT NULL,
+        id TEXT NOT NULL,
+        expires_at REAL NOT NULL,
+        ok INTEGER NOT NULL,
+        reason TEXT NOT NULL,
+        name TEXT,
+        PRIMARY KEY (kind, id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_id_cache_expires ON id_cache (expires_at);
+    """
+    # Keys per SELECT, under SQLite's bound-parameter limit
+    QUERY_BATCH = 400
+
+    def __init__(self, path=CACHE_DB_PATH, maxsize=CACHE_SIZE, ttl=CACHE_TTL_SECONDS, negative_ttl=NEGATIVE_TTL_SECONDS):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connect().executescript(self._SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def get_many(self, keys):
+        now = time.time()
+        found = {}
+        conn = self._connect()
+        for kind in {kind for kind, _ in keys}:
+            ids = [id_ for key_kind, id_ in keys if key_kind == kind]
+            for start in range(0, len(ids), self.QUERY_BATCH):
+                batch = ids[start:start + self.QUERY_BATCH]
+                rows = conn.execute(
+                    f"SELECT id, ok, reason, name FROM id_cache WHERE kind = ? AND expires_at >= ? "
+                    f"AND id IN ({','.join('?' * len(batch))})",
+                    [kind, now] + batch,
+                )
+                for id_, ok, reason, name in rows:
+                    found[(kind, id_)] = IdStatus(bool(ok), reason, name)
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items):
+        now = time.time()
+        rows = [
+            (kind, id_, now + (self.ttl if status.ok else self.negative_ttl), 1 if status.ok else 0, status.reason, status.name)
+            for (kind, id_), status in items.items()
+            # Lookups that could not run are retried next time
+            if status.ok is not None
+        ]
+        if not rows:
+            return
+        conn = self._connect()
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO id_cache VALUES (?, ?, ?, ?, ?, ?)", rows)
+            conn.execute("DELETE FROM id_cache WHERE expires_at < ?", (now,))
+            excess = conn.execute("SELECT count(*) FROM id_cache").fetchone()[0] - self.maxsize
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM id_cache WHERE (kind, id) IN "
+                    "(SELECT kind, id FROM id_cache ORDER BY expires_at LIMIT ?)",
+                    (excess,),
+                )
+
+    def clear(self):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM id_cache")
+
+    def __len__(self):
+        return self._connect().execute("SELECT count(*) FROM id_cache").fetchone()[0]
+
+
+def make_cache():
+    return SqliteIdCache() if CACHE_DB_PATH else IdCache()
+
+
+# Row positions of each factorize code, found in one pass over the column
+# (positions[code] in row order)
+def _positions_by_code(codes, count):
+    order = np.argsort(codes, kind="stable")
+    ordered = codes[order]
+    wanted = np.arange(count)
+    starts = np.searchsorted(ordered, wanted, side="left")
+    ends = np.searchsorted(ordered, wanted, side="right")
+    return [order[start:end] for start, end in zip(starts, ends)]
+
+
+class IdVerifier:
+    def __init__(self, backend=None, cache=None):
+        self.backend = backend or make_backend()
+        self.cache = cache if cache is not None else make_cache()
+        self.lookups = 0
+        self._lock = threading.Lock()
+
+    # Verify distinct ids of one kind; returns {normalized id: IdStatus}
+    def verify_many(self, kind, ids):
+        ids = list(dict.fromkeys(ids))
+        cached = self.cache.get_many([(kind, id_) for id_ in ids])
+        results = {id_: cached[(kind, id_)] for id_ in ids if (kind, id_) in cached}
+        missing = [id_ for id_ in ids if id_ not in results]
+        if missing:
+            start = perf_counter()
+            fresh = {}
+            for offset in range(0, len(missing), self.backend.batch_size):
+                fresh.update(self.backend.verify(kind, missing[offset:offset + self.backend.batch_size]))
+            perf.record("id_lookup", perf_counter() - start, ok=all(status.ok is not None for status in fresh.values()))
+            with self._lock:
+                self.lookups += len(missing)
+            self.cache.put_many({(kind, id_): status for id_, status in fresh.items()})
+            results.update(fresh)
+        return results
+
+    # Validate every id column of a table (or a single form as a 1-row
+    # table). Each distinct value is normalized and checked once; errors
+    # follow the validation_error format, in row order, with row numbers
+    # from the index.
+    def validate_frame(self, df):
+        if df.empty:
+            return []
+        row_numbers = [label + 1 if isinstance(label, int) else label for label in df.index.tolist()]
+        found = []
+        for order, (field, kind) in enumerate(ID_FIELDS.items()):
+            if field not in df.columns:
+                continue
+            codes, uniques = pd.factorize(df[field])
+            normalized = [normalize_id(kind, value) for value in uniques]
+            statuses = self.verify_many(kind, [id_ for id_, problem in normalized if id_ and not problem])
+            positions = None
+            for code, (id_, problem) in enumerate(normalized):
+                if not id_:
+                    continue
+                status = statuses.get(id_)
+                if problem:
+                    message, error_code, severity = problem, "id_invalido", "erro"
+                elif status.ok is False:
+                    message, error_code, severity = status.reason, "id_invalido", "erro"
+                elif status.ok is None:
+                    message, error_code, severity = status.reason, "id_nao_verificado", "aviso"
+                else:
+                    continue
+                if positions is None:
+                    positions = _positions_by_code(codes, len(uniques))
+                for position in positions[code]:
+                    found.append((position, order, validation_error(
+                        row_numbers[position], field, f"{field} {id_}: {message}", error_code, severity)))
+        found.sort(key=lambda item: (item[0], item[1]))
+        return [error for _, _, error in found]
+
+    # Same checks for a single form (e.g. the campaign page)
+    def validate_record(self, record, row=None):
+        errors = self.validate_frame(pd.DataFrame([record]))
+        for error in errors:
+            error["linha"] = row
+        return errors
+
+    def stats(self):
+        return {
+            "backend": self.backend.__class__.__name__,
+            "cache": self.cache.__class__.__name__,
+            "cache_entries": len(self.cache),
+            "hits": self.cache.hits,
+            "misses": self.cache.misses,
+            "lookups": self.lookups,
+        }
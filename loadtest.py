@@ -0,0 +1,170 @@
+import os
+import sys
+import json
+import tempfile
+import argparse
+from time import perf_counter
+
+# Keep load-test submissions out of the real audit log and make sure every
+# webhook call lands in the perf ring buffer (latencies are read from there)
+os.environ.setdefault("AUDIT_DB_PATH", os.path.join(tempfile.gettempdir(), "dash-loadtest-audit.sqlite3"))
+os.environ["PERF_METRICS"] = "1"
+os.environ.setdefault("PERF_BUFFER_SIZE", "1000000")
+
+import pandas as pd
+
+import perf
+from core import ADS_COLUMNS, WEBHOOK_URL, build_ads_payload, build_campaign_payload, submit_payloads
+from mock_webhook import MockWebhook, add_mock_arguments, config_from_args
+
+# Drives the real delivery path (submit_payloads -> send_to_webhook) against
+# a webhook and reports throughput, tail latency and errors per concurrency:
+#   python loadtest.py --mock --latency-ms 80 --jitter-ms 40 --error-rate 0.02 --concurrency 1,4,16
+#   python loadtest.py --webhook-url http://staging:5678/webhook/... --requests 50
+
+
+def synthetic_ads(rows):
+    return pd.DataFrame({
+        "ID Adset": [f"2385{i:08d}" for i in range(rows)],
+        "Nome Anúncio": [f"Anúncio de carga {i}" for i in range(rows)],
+        "Tipo de Anúncio": ["Imagem"] * rows,
+        "ID da Página do Facebook": ["102938475610293"] * rows,
+        "Status do Anúncio": ["PAUSED"] * rows,
+        "Link de Destino": [f"https://exemplo.com.br/oferta?utm_content={i}" for i in range(rows)],
+        "Texto do Anúncio": ["Texto de teste de carga com tamanho parecido com o de um anúncio real. " * 3] * rows,
+        "Call to Action (CTA)": ["LEARN_MORE"] * rows,
+        "BM Conectada": ["Piai & Associados"] * rows,
+        "ID Conta de Anúncios": [f"act_{1000 + i % 5}" for i in range(rows)],
+    }, columns=ADS_COLUMNS)
+
+
+def synthetic_campaign(index):
+    return {
+        "ID da Página": 102938475610293,
+        "ID da Conta de Anúncios": 1000 + index % 5,
+        "Tipo de Campanha": "ABO",
+        "Nome da Campanha": f"Campanha de carga {index}",
+        "Objetivo da Campanha": "TRAFFIC",
+        "Status da Campanha": "PAUSED",
+        "Nome do Ad Set": f"Ad Set {index}",
+        "Tipo de Otimização": "LINK_CLICKS",
+        "Orçamento Diário": 50.0,
+        "Nome do Anúncio": f"Anúncio {index}",
+        "Texto do Anúncio": "Texto de teste de carga",
+        "Link de Destino": "https://exemplo.com.br",
+        "Imagens": ["https://drive.google.com/file/d/exemplo/view"],
+        "Cidade": "São Paulo",
+        "Estado (SP, AL, MT...)": "SP",
+        "País (BR, EUA...)": "BR",
+    }
+
+
+def payloads(kind, requests, rows_per_request):
+    if kind == "campaigns":
+        for index in range(requests):
+            yield build_campaign_payload(synthetic_campaign(index))
+        return
+    # The rows are built once; each request still serializes its own payload
+    ads = synthetic_ads(rows_per_request)
+    for _ in range(requests):
+        yield build_ads_payload(ads, "https://drive.google.com/file/d/exemplo/view", "")
+
+
+def _error_key(message):
+    # "Erro: 503 - {...}" -> "503"; connection errors keep their exception text
+    text = message[len("Erro: "):] if message.startswith("Erro: ") else message
+    return text.split(" - ", 1)[0][:120]
+
+
+def run_level(url, kind, requests, rows_per_request, concurrency):
+    perf.reset()
+    errors = {}
+    rows = {"sent": 0}
+
+    def on_result(payload, success, message):
+        if success:
+            rows["sent"] += len(payload["dados"]) if isinstance(payload["dados"], list) else 1
+        else:
+            key = _error_key(message)
+            errors[key] = errors.get(key, 0) + 1
+
+    start = perf_counter()
+    sent, failed = submit_payloads(payloads(kind, requests, rows_per_request), url, concurrency, on_result=on_result)
+    elapsed = perf_counter() - start
+
+    stats = {entry["phase"]: entry for entry in perf.summarize()}
+    webhook = stats.get("webhook", {})
+    serialization = stats.get("serialization", {})
+    return {
+        "concurrency": concurrency,
+        "requests": sent + failed,
+        "ok": sent,
+        "failed": failed,
+        "seconds": elapsed,
+        "requests_per_second": (sent + failed) / elapsed if elapsed else 0.0,
+        "rows_per_second": rows["sent"] / elapsed if elapsed else 0.0,
+        "p50_ms": webhook.get("p50", 0.0) * 1000,
+        "p95_ms": webhook.get("p95", 0.0) * 1000,
+        "p99_ms": webhook.get("p99", 0.0) * 1000,
+        "max_ms": webhook.get("max", 0.0) * 1000,
+        "serialization_p50_ms": serialization.get("p50", 0.0) * 1000,
+        "errors": errors,
+    }
+
+
+def print_table(results, stream=sys.stdout):
+    header = f"{'conc':>5} {'envios':>7} {'ok':>6} {'falhas':>7} {'req/s':>8} {'linhas/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}"
+    print(header, file=stream)
+    for r in results:
+        print(
+            f"{r['concurrency']:>5} {r['requests']:>7} {r['ok']:>6} {r['failed']:>7} {r['requests_per_second']:>8.1f} "
+            f"{r['rows_per_second']:>9.0f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['max_ms']:>8.1f}",
+            file=stream,
+        )
+        for key, count in sorted(r["errors"].items(), key=lambda item: -item[1]):
+            print(f"{'':>5}   {count} x {key}", file=stream)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Teste de carga do envio ao webhook")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--mock", action="store_true", help="Sobe o webhook simulado neste processo")
+    target.add_argument("--webhook-url", help="Webhook de destino (nunca use o de produção)")
+    parser.add_argument("--kind", choices=["ads", "campaigns"], default="ads")
+    parser.add_argument("--requests", type=int, default=200, help="Envios por nível de concorrência")
+    parser.add_argument("--rows-per-request", type=int, default=50, help="Anúncios por envio (--kind ads)")
+    parser.add_argument("--concurrency", default="1,4,16", help="Níveis de concorrência, ex: 1,4,16")
+    parser.add_argument("--json", action="store_true", help="Imprime os resultados em JSON")
+    add_mock_arguments(parser)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.webhook_url and args.webhook_url == WEBHOOK_URL:
+        parser.error("--webhook-url aponta para o webhook configurado no app; use um ambiente de teste ou --mock")
+    server = None
+    url = args.webhook_url
+    if args.mock:
+        server = MockWebhook(config_from_args(args)).start_in_thread()
+        url = server.url
+
+    try:
+        results = [
+            run_level(url, args.kind, args.requests, args.rows_per_request, int(level))
+            for level in args.concurrency.split(",") if level.strip()
+        ]
+    finally:
+        if server is not None:
+            server.stop()
+
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+    else:
+        print_table(results)
+    return 0 if all(r["failed"] == 0 for r in results) else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
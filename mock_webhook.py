@@ -0,0 +1,243 @@
+import sys
+import json
+import random
+import asyncio
+import argparse
+import threading
+
+import wire
+
+# Local stand-in for the n8n webhook, for load tests and for reproducing
+# failures without touching production:
+#   python mock_webhook.py --port 8765 --latency-ms 80 --jitter-ms 40 --error-rate 0.02 --status-codes 500,503,429
+# then point WEBHOOK_URL (or --webhook-url in cli.py) at http://127.0.0.1:8765/webhook
+#
+# POST any path: answers after the configured latency with 200 or, at
+# error_rate, one of status_codes. With per_record the 200 body lists one
+# result per item of "dados", failing each at record_error_rate.
+# Bodies in any wire.py format (compact envelope, gzip, zstd) are decoded
+# first. With bandwidth_mbps the upload is paced as over a link of that speed.
+# GET /stats returns the counters as JSON; GET /health answers "ok".
+
+MAX_BODY_BYTES = 256 * 1024 * 1024
+
+
+class MockConfig:
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, status_codes=(500,),
+                 per_record=False, record_error_rate=0.0, hang_rate=0.0, bandwidth_mbps=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.status_codes = list(status_codes) or [500]
+        self.per_record = per_record
+        self.record_error_rate = record_error_rate
+        # Requests that never get an answer, to exercise client timeouts
+        self.hang_rate = hang_rate
+        # Client uplink to simulate (0: unlimited), so body size shows up in latency
+        self.bandwidth_mbps = bandwidth_mbps
+        self.random = random.Random(seed)
+
+
+class MockWebhook:
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        self.config = config or MockConfig()
+        self.host = host
+        self.port = port
+        self.stats = {"requests": 0, "ok": 0, "errors": 0, "hung": 0, "bytes": 0, "records": 0, "by_status": {}}
+        self._server = None
+        self._connections = set()
+        self._loop = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/webhook"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    # Run the server on its own event loop thread; returns once it listens
+    def start_in_thread(self):
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self.start())
+            ready.set()
+            self._loop.run_forever()
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name="mock-webhook", daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def stop(self):
+        if self._loop is None or self._loop.is_closed():
+            return
+
+        async def shutdown():
+            self._server.close()
+            # Idle keep-alive and hung connections would otherwise hold wait_closed
+            connections = list(self._connections)
+            for task in connections:
+                task.cancel()
+            await asyncio.gather(*connections, return_exceptions=True)
+            await self._server.wait_closed()
+            self._loop.stop()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self._loop)
+        self._thread.join(timeout=5)
+
+    async def _handle(self, reader, writer):
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            # HTTP/1.1 keep-alive: serve requests until the client closes
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", "0"))
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, 413, {"erro": "payload muito grande"}, close=True)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                close = headers.get("connection", "").lower() == "close"
+
+                if method == "GET":
+                    if path.startswith("/stats"):
+                        await self._respond(writer, 200, self.stats, close)
+                    else:
+                        await self._respond(writer, 200, "ok", close)
+                else:
+                    await self._answer_post(writer, body, headers, close)
+                if close:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError, asyncio.CancelledError):
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    async def _answer_post(self, writer, body, headers, close):
+        config = self.config
+        self.stats["requests"] += 1
+        self.stats["bytes"] += len(body)
+        if config.bandwidth_mbps:
+            await asyncio.sleep(len(body) * 8 / (config.bandwidth_mbps * 1_000_000))
+        if config.hang_rate and config.random.random() < config.hang_rate:
+            self.stats["hung"] += 1
+            # Hold the connection open until the client gives up
+            await asyncio.sleep(3600)
+            return
+
+        delay = config.latency_ms + (config.random.uniform(-config.jitter_ms, config.jitter_ms) if config.jitter_ms else 0)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+
+        try:
+            payload = wire.decode(body, headers) if body else {}
+        except Exception:
+            await self._respond(writer, 400, {"erro": "corpo inválido"}, close)
+            self._count(400)
+            return
+        records = payload.get("dados") if isinstance(payload, dict) else None
+        records = records if isinstance(records, list) else [records] if records else []
+        self.stats["records"] += len(records)
+
+        if config.error_rate and config.random.random() < config.error_rate:
+            status = config.random.choice(config.status_codes)
+            await self._respond(writer, status, {"erro": f"falha simulada ({status})"}, close)
+            self._count(status)
+            return
+
+        if config.per_record:
+            results = [
+                {"indice": index, "ok": not (config.record_error_rate and config.random.random() < config.record_error_rate)}
+                for index in range(len(records))
+            ]
+            response = {"recebidos": len(records), "resultados": results}
+        else:
+            response = {"recebidos": len(records)}
+        await self._respond(writer, 200, response, close)
+        self._count(200)
+
+    def _count(self, status):
+        self.stats["ok" if status == 200 else "errors"] += 1
+        self.stats["by_status"][str(status)] = self.stats["by_status"].get(str(status), 0) + 1
+
+    @staticmethod
+    async def _respond(writer, status, data, close):
+        body = (data if isinstance(data, str) else json.dumps(data, ensure_ascii=False)).encode("utf-8")
+        content_type = "text/plain" if isinstance(data, str) else "application/json"
+        head = (
+            f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+            f"Content-Type: {content_type}; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+
+def add_mock_arguments(parser):
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latência média de cada resposta")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Variação uniforme em torno da latência")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fração de envios respondidos com erro")
+    parser.add_argument("--status-codes", default="500", help="Códigos de erro sorteados, ex: 500,502,503,429")
+    parser.add_argument("--per-record", action="store_true", help="Responde um resultado por item de 'dados'")
+    parser.add_argument("--record-error-rate", type=float, default=0.0, help="Fração de itens com falha no modo --per-record")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="Fração de envios que nunca recebem resposta")
+    parser.add_argument("--bandwidth-mbps", type=float, default=0.0, help="Velocidade de upload simulada (0: sem limite)")
+    parser.add_argument("--seed", type=int, default=None, help="Semente para resultados reprodutíveis")
+
+
+def config_from_args(args):
+    return MockConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        status_codes=[int(code) for code in args.status_codes.split(",") if code.strip()],
+        per_record=args.per_record,
+        record_error_rate=args.record_error_rate,
+        hang_rate=args.hang_rate,
+        bandwidth_mbps=args.bandwidth_mbps,
+        seed=args.seed,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor local que simula o webhook do n8n")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_mock_arguments(parser)
+    args = parser.parse_args(argv)
+
+    server = MockWebhook(config_from_args(args), args.host, args.port)
+    print(f"Webhook simulado em http://{args.host}:{args.port}/webhook", file=sys.stderr)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
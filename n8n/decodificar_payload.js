@@ -0,0 +1,78 @@
+// Reference decoder for the n8n side of wire.py: paste into a Code node
+// ("Run Once for All Items") right after the Webhook node. The output keeps
+// the Webhook node's shape, with "body" holding the original payload
+// ({tipo_requisicao, dados: [...], timestamp}), so the nodes after it don't change.
+//
+// - Plain JSON bodies pass through untouched.
+// - Compressed bodies (WEBHOOK_COMPRESSION=gzip|zstd): turn on the Webhook
+//   node's "Raw Body" option, so the body arrives as binary "data", and allow
+//   zlib in the Code node (NODE_FUNCTION_ALLOW_BUILTIN=zlib). zstd needs
+//   Node.js 22.15+ (zlib.zstdDecompressSync).
+// - Compact envelopes (WEBHOOK_FORMAT=compacto, format "compacto/1") are
+//   expanded back into one object per record.
+
+const COMPACT_FORMAT = 'compacto/1';
+
+function decompress(buffer) {
+  const zlib = require('zlib');
+  if (buffer[0] === 0x1f && buffer[1] === 0x8b) {
+    return zlib.gunzipSync(buffer);
+  }
+  if (buffer[0] === 0x28 && buffer[1] === 0xb5 && buffer[2] === 0x2f && buffer[3] === 0xfd) {
+    if (!zlib.zstdDecompressSync) {
+      throw new Error('corpo zstd exige Node.js 22.15 ou superior');
+    }
+    return zlib.zstdDecompressSync(buffer);
+  }
+  return buffer;
+}
+
+function decodeColumn(column) {
+  if (column.valores) {
+    return column.valores;
+  }
+  if (column.dicionario) {
+    return column.indices.map((index) => column.dicionario[index]);
+  }
+  // Front coding: UTF-16 units shared with the previous value (the same
+  // units as slice) + the rest
+  const values = [];
+  let previous = '';
+  column.prefixos.forEach((size, i) => {
+    previous = previous.slice(0, size) + column.sufixos[i];
+    values.push(previous);
+  });
+  return values;
+}
+
+function expand(envelope) {
+  if (!envelope || envelope.formato !== COMPACT_FORMAT) {
+    return envelope;
+  }
+  const { formato, total, campos, comuns, colunas, tipo_requisicao, ...rest } = envelope;
+  const columns = {};
+  for (const field of Object.keys(colunas)) {
+    columns[field] = decodeColumn(colunas[field]);
+  }
+  const dados = [];
+  for (let i = 0; i < total; i++) {
+    const record = {};
+    for (const field of campos) {
+      record[field] = field in columns ? columns[field][i] : comuns[field];
+    }
+    dados.push(record);
+  }
+  return { tipo_requisicao, dados, ...rest };
+}
+
+const results = [];
+for (let i = 0; i < $input.all().length; i++) {
+  const item = $input.all()[i];
+  let body = item.json.body;
+  if (item.binary && item.binary.data) {
+    const raw = decompress(await this.helpers.getBinaryDataBuffer(i, 'data'));
+    body = JSON.parse(raw.toString('utf8'));
+  }
+  results.push({ json: { ...item.json, body: expand(body) } });
+}
+return results;
@@ -0,0 +1,181 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+
+# Process-wide timing instrumentation for the Streamlit pages.
+# Set PERF_METRICS=0 to disable; timed() then returns a shared no-op object.
+ENABLED = os.environ.get("PERF_METRICS", "1") != "0"
+BUFFER_SIZE = int(os.environ.get("PERF_BUFFER_SIZE", "5000"))
+SESSION_IDLE_SECONDS = 30 * 60
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+# Each entry: (timestamp, page, phase, seconds, ok)
+_samples = deque(maxlen=BUFFER_SIZE)
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+class _Timer:
+    __slots__ = ("phase", "page", "start")
+
+    def __init__(self, phase, page):
+        self.phase = phase
+        self.page = page
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Streamlit's rerun/stop signals derive from BaseException and are not failures
+        ok = exc_type is None or not issubclass(exc_type, Exception)
+        record(self.phase, time.perf_counter() - self.start, page=self.page, ok=ok)
+        return False
+
+
+class _NoopTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopTimer()
+
+
+# Context manager timing a phase: `with timed("validation", page="ads"): ...`
+def timed(phase, page=""):
+    if not ENABLED:
+        return _NOOP
+    return _Timer(phase, page)
+
+
+# Decorator version of timed(); resolved at decoration time so a disabled
+# build returns the original function untouched
+def timed_function(phase, page=""):
+    def decorator(func):
+        if not ENABLED:
+            return func
+
+        def wrapper(*args, **kwargs):
+            with _Timer(phase, page):
+                return func(*args, **kwargs)
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        wrapper.__wrapped__ = func
+        return wrapper
+    return decorator
+
+
+def record(phase, seconds, page="", ok=True):
+    if ENABLED:
+        # deque.append is atomic, so no lock is needed on the hot path
+        _samples.append((time.time(), page, phase, seconds, ok))
+
+
+def touch_session(session_id):
+    if not ENABLED or not session_id:
+        return
+    with _sessions_lock:
+        _sessions[session_id] = time.time()
+
+
+def active_sessions(idle_seconds=SESSION_IDLE_SECONDS):
+    cutoff = time.time() - idle_seconds
+    with _sessions_lock:
+        for session_id in [sid for sid, seen in _sessions.items() if seen < cutoff]:
+            del _sessions[session_id]
+        return len(_sessions)
+
+
+def samples():
+    return list(_samples)
+
+
+def reset():
+    _samples.clear()
+    with _sessions_lock:
+        _sessions.clear()
+
+
+# Aggregate the ring buffer into per (page, phase) stats and bucket counts
+def summarize(entries=None):
+    if entries is None:
+        entries = samples()
+    groups = {}
+    for _, page, phase, seconds, ok in entries:
+        groups.setdefault((page, phase), []).append((seconds, ok))
+
+    summary = []
+    for (page, phase), values in sorted(groups.items()):
+        durations = sorted(seconds for seconds, _ in values)
+        count = len(durations)
+        bucket_counts = []
+        for bound in BUCKETS:
+            bucket_counts.append(sum(1 for d in durations if d <= bound))
+        summary.append({
+            "page": page,
+            "phase": phase,
+            "count": count,
+            "errors": sum(1 for _, ok in values if not ok),
+            "sum": sum(durations),
+            "p50": _percentile(durations, 0.50),
+            "p95": _percentile(durations, 0.95),
+            "p99": _percentile(durations, 0.99),
+            "max": durations[-1],
+            "buckets": bucket_counts,
+        })
+    return summary
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Prometheus text exposition format (cumulative histogram buckets)
+def export_prometheus():
+    lines = [
+        "# HELP dash_phase_latency_seconds Latency of instrumented app phases.",
+        "# TYPE dash_phase_latency_seconds histogram",
+    ]
+    summary = summarize()
+    for stats in summary:
+        labels = f'page="{_escape_label(stats["page"])}",phase="{_escape_label(stats["phase"])}"'
+        for bound, count in zip(BUCKETS, stats["buckets"]):
+            lines.append(f'dash_phase_latency_seconds_bucket{{{labels},le="{bound}"}} {count}')
+        lines.append(f'dash_phase_latency_seconds_bucket{{{labels},le="+Inf"}} {stats["count"]}')
+        lines.append(f'dash_phase_latency_seconds_sum{{{labels}}} {stats["sum"]:.6f}')
+        lines.append(f'dash_phase_latency_seconds_count{{{labels}}} {stats["count"]}')
+
+    lines.append("# HELP dash_phase_errors_total Instrumented phases that raised or reported failure.")
+    lines.append("# TYPE dash_phase_errors_total counter")
+    for stats in summary:
+        labels = f'page="{_escape_label(stats["page"])}",phase="{_escape_label(stats["phase"])}"'
+        lines.append(f'dash_phase_errors_total{{{labels}}} {stats["errors"]}')
+
+    lines.append("# HELP dash_active_sessions Streamlit sessions seen recently.")
+    lines.append("# TYPE dash_active_sessions gauge")
+    lines.append(f"dash_active_sessions {active_sessions()}")
+    return "\n".join(lines) + "\n"
+
+
+# One JSON object per sample
+def export_jsonl():
+    return "".join(
+        json.dumps({"ts": ts, "page": page, "phase": phase, "seconds": seconds, "ok": ok}) + "\n"
+        for ts, page, phase, seconds, ok in samples()
+    )
@@ -0,0 +1,278 @@
+import os
+import json
+import atexit
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+
+import audit_log
+
+# Compact preview of a webhook payload: counts, per-account totals, distinct
+# creatives and an estimated size, a truncated JSON view and a diff against
+# the last successful submission of each account. Everything shown is bounded
+# (sampled rows, top accounts, a few examples), so the page costs the same to
+# render for 10 rows or 100k.
+SAMPLE_ROWS = 50
+PREVIEW_ITEMS = 5
+MAX_PREVIEW_ITEMS = 200
+MAX_STRING = 300
+MAX_ACCOUNTS_SHOWN = 20
+DIFF_EXAMPLES = 10
+# Accounts with more ads than this only keep counts in their snapshot
+MAX_SNAPSHOT_ITEMS = 100000
+# Snapshots of successful sends are computed and written in the background,
+# batched over this many seconds, so a send returns as soon as the webhook answers
+SNAPSHOT_DELAY_SECONDS = float(os.environ.get("SNAPSHOT_DELAY_SECONDS", "1"))
+
+ITEM_KEY_FIELDS = ("Nome Anúncio", "Nome da Campanha")
+CREATIVE_FIELDS = ("Tipo de Anúncio", "Texto do Anúncio", "Link de Destino", "Call to Action (CTA)", "CTA")
+MEDIA_FIELDS = ("Imagens", "Thumbnail (Video)")
+VOLATILE_FIELDS = ("SubmissionTime",) + MEDIA_FIELDS
+
+logger = logging.getLogger(__name__)
+_pending = []
+_pending_lock = threading.Lock()
+_timer = None
+
+
+def _records(payload):
+    data = payload.get("dados") if isinstance(payload, dict) else None
+    return data if isinstance(data, list) else [data] if isinstance(data, dict) else []
+
+
+def _first_field(frame, fields):
+    for field in fields:
+        if field in frame.columns:
+            return field
+    return None
+
+
+# Normalized account per row; each distinct value is normalized once
+def _accounts(frame):
+    field = _first_field(frame, audit_log.ACCOUNT_FIELDS)
+    if field is None:
+        return pd.Series([None] * len(frame), index=frame.index, dtype=object)
+    codes, uniques = pd.factorize(frame[field])
+    normalized = np.array([audit_log.normalize_account(value) for value in uniques] + [None], dtype=object)
+    return pd.Series(normalized[codes], index=frame.index)
+
+
+# One content hash per row over the non-volatile fields; values go through
+# str so a table row and its JSON record hash the same
+def _row_hashes(frame):
+    columns = sorted(col for col in frame.columns if col not in VOLATILE_FIELDS)
+    if not columns:
+        return pd.Series(np.zeros(len(frame), dtype=np.uint64), index=frame.index)
+    return pd.util.hash_pandas_object(frame[columns].astype(str), index=False)
+
+
+def _item_keys(frame):
+    field = _first_field(frame, ITEM_KEY_FIELDS)
+    keys = frame[field].astype(str) if field else pd.Series(["linha"] * len(frame), index=frame.index)
+    # Repeated names get a running suffix so every row stays addressable
+    if not keys.duplicated().any():
+        return keys
+    occurrence = keys.groupby(keys).cumcount()
+    return keys.where(occurrence == 0, keys + " #" + (occurrence + 1).astype(str))
+
+
+def _media(records):
+    if records:
+        first = records[0]
+        return [link for link in first.get("Imagens") or []] + [first.get("Thumbnail (Video)") or ""]
+    return []
+
+
+def _sample_positions(length, size=SAMPLE_ROWS):
+    if length <= size:
+        return np.arange(length)
+    return np.linspace(0, length - 1, size).astype(int)
+
+
+def summarize_frame(frame, request_type, media=(), accounts=None):
+    accounts = _accounts(frame) if accounts is None else accounts
+    counts = accounts.value_counts()
+    creative_columns = [col for col in CREATIVE_FIELDS if col in frame.columns]
+    creatives = int(frame[creative_columns].astype(str).drop_duplicates().shape[0]) if creative_columns and len(frame) else len(frame)
+
+    # Size estimate from evenly spaced sample rows
+    sample = frame.iloc[_sample_positions(len(frame))].to_dict("records")
+    record_bytes = (len(json.dumps(sample, default=str).encode("utf-8")) / len(sample)) if sample else 0
+    media_bytes = len(json.dumps(list(media)).encode("utf-8")) + 60 if media else 0
+    return {
+        "tipo": request_type,
+        "linhas": len(frame),
+        "contas": {account: int(count) for account, count in counts.head(MAX_ACCOUNTS_SHOWN).items()},
+        "total_contas": int(counts.shape[0]),
+        "criativos": creatives,
+        "midias": len([link for link in media if link]),
+        "bytes_estimados": int(len(frame) * (record_bytes + media_bytes) + 100),
+    }
+
+
+def summarize_payload(payload):
+    records = _records(payload)
+    frame = pd.DataFrame.from_records(records) if records else pd.DataFrame()
+    return summarize_frame(frame, payload.get("tipo_requisicao", ""), _media(records))
+
+
+# Copy of the payload with long lists cut to max_items and long strings
+# shortened; the cut points are marked so the view is never mistaken for
+# the full payload
+def truncate(value, max_items=PREVIEW_ITEMS, max_string=MAX_STRING):
+    if isinstance(value, dict):
+        return {key: truncate(item, max_items, max_string) for key, item in value.items()}
+    if isinstance(value, list):
+        head = [truncate(item, max_items, max_string) for item in value[:max_items]]
+        if len(value) > max_items:
+            head.append(f"… mais {len(value) - max_items} itens")
+        return head
+    if isinstance(value, str) and len(value) > max_string:
+        return value[:max_string] + f"… (+{len(value) - max_string} caracteres)"
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+
+# Truncated view of a payload built from the first max_items rows of a
+# batch of total_rows, marked the same way truncate marks a cut list
+def sample_view(sample, total_rows, max_items=PREVIEW_ITEMS):
+    view = truncate(sample, max_items)
+    if isinstance(view.get("dados"), list) and total_rows > len(view["dados"]):
+        view["dados"].append(f"… mais {total_rows - len(view['dados'])} itens")
+    return view
+
+
+# Per-account fingerprint of what was sent: row count, media and one hash per
+# ad (or the full field set for a campaign)
+def frame_snapshots(frame, request_type, media=(), accounts=None):
+    if frame.empty:
+        return {}
+    accounts = _accounts(frame) if accounts is None else accounts
+    hashes = _row_hashes(frame)
+    keys = _item_keys(frame)
+    snapshots = {}
+    for account, positions in accounts.groupby(accounts, sort=False).indices.items():
+        snapshot = {"tipo": request_type, "linhas": len(positions), "midias": sorted(link for link in media if link)}
+        if len(positions) <= MAX_SNAPSHOT_ITEMS:
+            snapshot["itens"] = dict(zip(keys.iloc[positions].tolist(), hashes.iloc[positions].tolist()))
+        if request_type == "criar_campanha":
+            record = frame.iloc[positions[-1]]
+            snapshot["campos"] = {key: _jsonable(value) for key, value in record.items() if key not in VOLATILE_FIELDS}
+        snapshots[account] = snapshot
+    return snapshots
+
+
+def _jsonable(value):
+    if isinstance(value, float) and value != value:
+        return None
+    if isinstance(value, (np.integer, np.floating, np.bool_)):
+        return value.item()
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+
+def payload_snapshots(payload):
+    records = _records(payload)
+    frame = pd.DataFrame.from_records(records) if records else pd.DataFrame()
+    return frame_snapshots(frame, payload.get("tipo_requisicao", ""), _media(records))
+
+
+# Queue the snapshot of a successful submission (audit_log id) for the
+# background writer
+def schedule_snapshots(payload, submission_id, path=None):
+    global _timer
+    with _pending_lock:
+        _pending.append((payload, submission_id, path))
+        if _timer is None:
+            _timer = threading.Timer(SNAPSHOT_DELAY_SECONDS, flush_snapshots)
+            _timer.daemon = True
+            _timer.start()
+
+
+# Write the queued snapshots, newest first. A send whose accounts all have a
+# newer send in the same batch is skipped: its snapshot would be replaced anyway.
+def flush_snapshots():
+    global _timer
+    with _pending_lock:
+        batch = _pending[:]
+        _pending.clear()
+        _timer = None
+    written = set()
+    for payload, submission_id, path in reversed(batch):
+        try:
+            request_type = payload.get("tipo_requisicao", "")
+            accounts = {(path, request_type, account) for account in audit_log.accounts_in_payload(payload)[0]}
+            if accounts and accounts <= written:
+                continue
+            audit_log.save_snapshots(request_type, submission_id, payload_snapshots(payload), path=path)
+            written |= accounts
+        except Exception:
+            # Snapshots are a nice-to-have; a failure only costs the next diff
+            logger.exception("Falha ao gravar o snapshot do envio %s", submission_id)
+
+
+atexit.register(flush_snapshots)
+
+
+def _diff_items(before, after):
+    before_keys = before.keys()
+    after_keys = after.keys()
+    added = [key for key in after_keys if key not in before]
+    removed = [key for key in before_keys if key not in after]
+    changed = [key for key in after_keys if key in before and before[key] != after[key]]
+    return added, removed, changed
+
+
+def diff_snapshot(previous, current):
+    diff = {
+        "linhas_antes": previous["linhas"],
+        "linhas_agora": current["linhas"],
+        "midias_alteradas": previous.get("midias") != current.get("midias"),
+    }
+    if "itens" in previous and "itens" in current:
+        added, removed, changed = _diff_items(previous["itens"], current["itens"])
+        diff.update({
+            "novos": len(added), "removidos": len(removed), "alterados": len(changed),
+            "exemplos": {"novos": added[:DIFF_EXAMPLES], "removidos": removed[:DIFF_EXAMPLES], "alterados": changed[:DIFF_EXAMPLES]},
+        })
+    if "campos" in previous and "campos" in current:
+        fields = list(dict.fromkeys(list(current["campos"]) + list(previous["campos"])))
+        diff["campos_alterados"] = [
+            {"campo": field, "antes": previous["campos"].get(field), "depois": current["campos"].get(field)}
+            for field in fields if previous["campos"].get(field) != current["campos"].get(field)
+        ]
+    return diff
+
+
+# Diff each account of the pending submission against its last successful one
+def diff_against_last(snapshots, path=None):
+    diffs = []
+    for account, snapshot in list(snapshots.items())[:MAX_ACCOUNTS_SHOWN]:
+        last = audit_log.load_snapshot(snapshot["tipo"], account, path=path)
+        if last is None:
+            diffs.append({"conta": account, "anterior_em": None})
+            continue
+        ts, previous = last
+        diffs.append({"conta": account, "anterior_em": ts, **diff_snapshot(previous, snapshot)})
+    return diffs
+
+
+# Preview of an ads table before the payload is built; media is the list of
+# image links plus the thumbnail, as build_ads_payload adds them to every ad
+def preview_ads(ads_df, media):
+    accounts = _accounts(ads_df)
+    summary = summarize_frame(ads_df, "criar_anuncio", media, accounts)
+    return summary, diff_against_last(frame_snapshots(ads_df, "criar_anuncio", media, accounts))
+
+
+def preview_payload(payload):
+    records = _records(payload)
+    frame = pd.DataFrame.from_records(records) if records else pd.DataFrame()
+    request_type = payload.get("tipo_requisicao", "")
+    accounts = _accounts(frame)
+    summary = summarize_frame(frame, request_type, _media(records), accounts)
+    return summary, diff_against_last(frame_snapshots(frame, request_type, _media(records), accounts))
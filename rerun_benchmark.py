@@ -0,0 +1,121 @@
+import os
+import sys
+import json
+import tempfile
+import argparse
+from time import perf_counter
+
+# Benchmark state stays out of the real data directories
+_workdir = tempfile.mkdtemp(prefix="dash-rerun-benchmark-")
+os.environ.setdefault("AUDIT_DB_PATH", os.path.join(_workdir, "audit.sqlite3"))
+os.environ.setdefault("DRAFTS_DIR", os.path.join(_workdir, "drafts"))
+os.environ.setdefault("SCHEDULER_DB_PATH", os.path.join(_workdir, "scheduler.sqlite3"))
+os.environ["SCHEDULER_DISPATCH"] = "0"
+
+from streamlit.testing.v1 import AppTest
+
+from mock_webhook import MockWebhook
+
+# Counts full-script reruns, and the time spent in them, for an operator
+# filling in and sending campaigns on the Criar Campanhas page. The browser is
+# emulated: changing a widget reruns the script unless the widget sits inside
+# a form; a form submit button always reruns it.
+#   python rerun_benchmark.py --campaigns 3
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+# (widget kind, label, value) in the order an operator fills them
+CAMPAIGN_INPUTS = [
+    ("number_input", "ID da Página", 102938475610293),
+    ("number_input", "ID da Conta de Anúncios", 123456789012),
+    ("text_input", "Nome da Campanha", "Campanha de teste"),
+    ("selectbox", "Objetivo da Campanha", "TRAFFIC"),
+    ("selectbox", "Status da Campanha", "PAUSED"),
+    ("text_input", "Nome do Ad Set", "Ad Set de teste"),
+    ("selectbox", "Tipo de Otimização", "LINK_CLICKS"),
+    ("number_input", "Orçamento Diário", 50.0),
+    ("text_input", "Nome do Anúncio", "Anúncio de teste"),
+    ("text_input", "Link de Destino", "https://exemplo.com.br"),
+    ("text_area", "Texto do Anúncio", "Conheça a nova coleção"),
+    ("selectbox", "Call to Action", "LEARN_MORE"),
+    ("text_input", "Cidade", "São Paulo"),
+    ("text_input", "Estado (SP, AL, MT...)", "SP"),
+    ("text_input", "País (BR, Us...)", "BR"),
+]
+SUBMIT_LABEL = "Enviar Campanha"
+
+
+class _Session:
+    def __init__(self, timeout):
+        self.app = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        self.reruns = 0
+        self.seconds = 0.0
+
+    def run(self):
+        start = perf_counter()
+        self.app.run()
+        self.seconds += perf_counter() - start
+        self.reruns += 1
+        if self.app.exception:
+            raise RuntimeError(self.app.exception[0].message)
+
+    def widget(self, kind, label):
+        for widget in getattr(self.app, kind):
+            if widget.label == label:
+                return widget
+        raise LookupError(f"{kind} '{label}' não encontrado")
+
+    # A change reruns the script only outside a form, as in the browser
+    def change(self, kind, label, value):
+        widget = self.widget(kind, label)
+        widget.set_value(value)
+        if not widget.form_id:
+            self.run()
+
+
+def fill_and_send(timeout=60):
+    session = _Session(timeout)
+    session.run()
+    session.app.session_state["page"] = "Create Campaigns"
+    session.run()
+    for kind, label, value in CAMPAIGN_INPUTS:
+        session.change(kind, label, value)
+    button = next(button for button in session.app.button if SUBMIT_LABEL in button.label)
+    button.click()
+    session.run()
+    sent = any("success-message" in markdown.value for markdown in session.app.markdown)
+    return {"reruns": session.reruns, "seconds": session.seconds, "sent": sent}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reexecuções do script por campanha criada")
+    parser.add_argument("--campaigns", type=int, default=3, help="Campanhas preenchidas e enviadas (uma sessão cada)")
+    parser.add_argument("--json", action="store_true", help="Imprime os resultados em JSON")
+    args = parser.parse_args(argv)
+
+    server = MockWebhook().start_in_thread()
+    # core reads WEBHOOK_URL when the app first imports it
+    os.environ["WEBHOOK_URL"] = server.url
+    try:
+        results = [fill_and_send() for _ in range(args.campaigns)]
+    finally:
+        server.stop()
+
+    reruns = sum(r["reruns"] for r in results) / len(results)
+    seconds = sum(r["seconds"] for r in results) / len(results)
+    summary = {
+        "campaigns": len(results),
+        "sent": sum(1 for r in results if r["sent"]),
+        "reruns_per_campaign": reruns,
+        "script_seconds_per_campaign": seconds,
+        "ms_per_rerun": seconds / reruns * 1000 if reruns else 0.0,
+    }
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print(f"{summary['sent']}/{summary['campaigns']} campanhas enviadas")
+        print(f"{reruns:.1f} reexecuções por campanha, {seconds:.2f}s de script ({summary['ms_per_rerun']:.0f} ms cada)")
+    return 0 if summary["sent"] == summary["campaigns"] else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,346 @@
+import os
+import json
+import time
+import zlib
+import heapq
+import socket
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from core import APP_TZ, WEBHOOK_URL, deliver_to_webhook
+
+# Deferred submissions. A job is a ready-to-send webhook payload with a target
+# time, kept in SQLite (WAL) so it survives restarts and is seen by every
+# worker. Each process runs a dispatcher thread: due jobs are ordered on a
+# heap (target time, then priority), claimed with a conditional UPDATE so two
+# workers never send the same job, and sent through deliver_to_webhook (same
+# audit log and metrics as an immediate send).
+#
+# The webhook is not idempotent, so a job is only sent again automatically
+# when the request certainly never reached n8n (see core._retry_safe). Any
+# other failure is final, and a job whose process died mid-send goes to
+# REVIEW: an operator checks n8n/Meta and resends or confirms it.
+#
+# Starts are throttled per window across all workers: at most
+# MAX_JOBS_PER_WINDOW jobs / MAX_ROWS_PER_WINDOW rows every WINDOW_SECONDS;
+# the rest waits for the next window instead of hitting the webhook at once.
+SCHEDULER_DB_PATH = os.environ.get("SCHEDULER_DB_PATH", os.path.join("data", "scheduler.sqlite3"))
+# SCHEDULER_DISPATCH=0 keeps a process from sending. Deployments run the web
+# processes with it and one "python cli.py scheduler" process (Procfile,
+# deploy/run_workers.sh) that dispatches, since a web process only starts its
+# dispatcher once someone opens the app
+DISPATCH_ENABLED = os.environ.get("SCHEDULER_DISPATCH", "1") != "0"
+POLL_SECONDS = float(os.environ.get("SCHEDULER_POLL_SECONDS", "15"))
+WINDOW_SECONDS = int(os.environ.get("SCHEDULER_WINDOW_SECONDS", "60"))
+MAX_JOBS_PER_WINDOW = int(os.environ.get("SCHEDULER_MAX_JOBS_PER_WINDOW", "10"))
+MAX_ROWS_PER_WINDOW = int(os.environ.get("SCHEDULER_MAX_ROWS_PER_WINDOW", "5000"))
+CONCURRENCY = int(os.environ.get("SCHEDULER_CONCURRENCY", "2"))
+MAX_ATTEMPTS = 3
+RETRY_DELAY_SECONDS = 5 * 60
+# A job still "executando" after this long belonged to a process that died
+# and is moved to REVIEW
+STALE_RUNNING_SECONDS = 15 * 60
+# Due jobs loaded per poll
+HEAP_LIMIT = 500
+
+PENDING = "agendado"
+RUNNING = "executando"
+DONE = "enviado"
+FAILED = "falhou"
+CANCELLED = "cancelado"
+REVIEW = "a revisar"
+
+PRIORITIES = {"Normal": 0, "Alta": 1}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at INTEGER NOT NULL,
+    run_at INTEGER NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    request_type TEXT NOT NULL,
+    operator TEXT,
+    row_count INTEGER NOT NULL,
+    payload BLOB NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    started_at INTEGER,
+    finished_at INTEGER,
+    worker TEXT,
+    message TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_run_at ON jobs (status, run_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_started_at ON jobs (started_at);
+"""
+
+logger = logging.getLogger(__name__)
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+# Naive times are the operators' wall-clock times (APP_TZ), not the server's
+def _ms(moment):
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=APP_TZ)
+    return int(moment.timestamp() * 1000)
+
+
+def _row_count(payload):
+    data = payload.get("dados")
+    return len(data) if isinstance(data, list) else 1
+
+
+# Evenly spaced target times for count jobs between start and end
+def spread_times(count, start, end=None):
+    if count <= 0:
+        return []
+    if end is None or end <= start or count == 1:
+        return [start] * count
+    step = (end - start) / (count - 1)
+    return [start + step * i for i in range(count)]
+
+
+class Scheduler:
+    # send(payload, endpoint_url) -> (success, message, retry_safe)
+    def __init__(self, path=None, endpoint_url=WEBHOOK_URL, send=deliver_to_webhook):
+        self.path = path or SCHEDULER_DB_PATH
+        self.endpoint_url = endpoint_url
+        self.send = send
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._executor = None
+        self._running = set()
+        self._running_lock = threading.Lock()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connect().executescript(_SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # Queue payloads to be sent at the given times (datetime each); returns the job ids
+    def schedule_many(self, payloads, run_at, priority=0, operator=""):
+        created = _now_ms()
+        conn = self._connect()
+        ids = []
+        with conn:
+            for payload, moment in zip(payloads, run_at):
+                body = zlib.compress(json.dumps(payload, allow_nan=False).encode("utf-8"))
+                cursor = conn.execute(
+                    "INSERT INTO jobs (created_at, run_at, priority, request_type, operator, row_count, payload, status) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (created, _ms(moment), priority, payload.get("tipo_requisicao", ""), operator or None,
+                     _row_count(payload), body, PENDING),
+                )
+                ids.append(cursor.lastrowid)
+        self._wake.set()
+        return ids
+
+    def schedule(self, payload, run_at, priority=0, operator=""):
+        return self.schedule_many([payload], [run_at], priority, operator)[0]
+
+    # Queue payloads spread evenly between start and end
+    def schedule_spread(self, payloads, start, end=None, priority=0, operator=""):
+        payloads = list(payloads)
+        return self.schedule_many(payloads, spread_times(len(payloads), start, end), priority, operator)
+
+    def cancel(self, job_id):
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?",
+                (CANCELLED, _now_ms(), job_id, PENDING),
+            )
+        return cursor.rowcount == 1
+
+    # Send a failed or interrupted job again now (after checking it did not reach n8n)
+    def resend(self, job_id):
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, run_at = ?, finished_at = NULL, message = 'reenvio manual' "
+                "WHERE id = ? AND status IN (?, ?)",
+                (PENDING, _now_ms(), job_id, FAILED, REVIEW),
+            )
+        self._wake.set()
+        return cursor.rowcount == 1
+
+    # Close an interrupted job that did reach n8n
+    def confirm_sent(self, job_id):
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, message = 'confirmado manualmente' WHERE id = ? AND status = ?",
+                (DONE, _now_ms(), job_id, REVIEW),
+            )
+        return cursor.rowcount == 1
+
+    # Jobs (without the payload) in the given statuses; pending ones by target
+    # time, the others most recent first
+    def jobs(self, statuses, limit=100):
+        order = "run_at, priority DESC, id" if statuses == [PENDING] else "COALESCE(started_at, run_at) DESC, id DESC"
+        rows = self._connect().execute(
+            "SELECT id, created_at, run_at, priority, request_type, operator, row_count, status, attempts, "
+            f"started_at, finished_at, worker, message FROM jobs WHERE status IN ({','.join('?' * len(statuses))}) "
+            f"ORDER BY {order} LIMIT ?",
+            list(statuses) + [limit],
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def counts(self):
+        rows = self._connect().execute("SELECT status, count(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    # Rows of pending jobs per time bucket (bucket_seconds), for the load chart
+    def planned_load(self, bucket_seconds=3600, limit=48):
+        bucket_ms = bucket_seconds * 1000
+        rows = self._connect().execute(
+            "SELECT (run_at / ?) * ? AS bucket, count(*) AS jobs, sum(row_count) AS rows FROM jobs "
+            "WHERE status = ? GROUP BY bucket ORDER BY bucket LIMIT ?",
+            (bucket_ms, bucket_ms, PENDING, limit),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def start(self):
+        if self._thread is None:
+            self._executor = ThreadPoolExecutor(max_workers=CONCURRENCY, thread_name_prefix="scheduler-send")
+            self._thread = threading.Thread(target=self._loop, name="scheduler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, wait=True):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._executor.shutdown(wait=wait)
+            self._thread = None
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                delay = self.dispatch_due()
+            except Exception:
+                logger.exception("Falha no despachante de agendamentos")
+                delay = POLL_SECONDS
+            self._wake.wait(delay)
+            self._wake.clear()
+
+    # Start every due job the window allows; returns seconds until the next check
+    def dispatch_due(self):
+        now = _now_ms()
+        self._recover_stale(now)
+        rows = self._connect().execute(
+            "SELECT id, run_at, priority, row_count FROM jobs WHERE status = ? ORDER BY run_at LIMIT ?",
+            (PENDING, HEAP_LIMIT),
+        ).fetchall()
+        upcoming = [(row["run_at"], -row["priority"], row["id"], row["row_count"]) for row in rows]
+        heapq.heapify(upcoming)
+
+        # Everything due competes by priority, then by how late it is
+        ready = []
+        while upcoming and upcoming[0][0] <= now:
+            run_at, priority, job_id, rows_in_job = heapq.heappop(upcoming)
+            heapq.heappush(ready, (priority, run_at, job_id, rows_in_job))
+
+        jobs_left, rows_left = self._window_room(now)
+        while ready and jobs_left > 0 and len(self._running) < CONCURRENCY:
+            _, _, job_id, rows_in_job = ready[0]
+            # A job bigger than a whole window still goes out, alone
+            if rows_in_job > rows_left and rows_left < MAX_ROWS_PER_WINDOW:
+                break
+            heapq.heappop(ready)
+            if not self._claim(job_id, now):
+                continue
+            jobs_left -= 1
+            rows_left -= rows_in_job
+            with self._running_lock:
+                self._running.add(job_id)
+            self._executor.submit(self._run_job, job_id)
+
+        if ready:
+            # Held back by the window or by CONCURRENCY
+            return min(POLL_SECONDS, max(WINDOW_SECONDS / 4, 1))
+        if upcoming:
+            return max(min(POLL_SECONDS, (upcoming[0][0] - now) / 1000), 0.05)
+        return POLL_SECONDS
+
+    def _window_room(self, now):
+        jobs, rows = self._connect().execute(
+            "SELECT count(*), COALESCE(sum(row_count), 0) FROM jobs WHERE started_at >= ?",
+            (now - WINDOW_SECONDS * 1000,),
+        ).fetchone()
+        return MAX_JOBS_PER_WINDOW - jobs, MAX_ROWS_PER_WINDOW - rows
+
+    def _claim(self, job_id, now):
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, started_at = ?, worker = ?, attempts = attempts + 1 "
+                "WHERE id = ? AND status = ?",
+                (RUNNING, now, self.worker, job_id, PENDING),
+            )
+        return cursor.rowcount == 1
+
+    def _recover_stale(self, now):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, "
+                "message = 'interrompido durante o envio; confira no n8n antes de reenviar' "
+                "WHERE status = ? AND started_at < ?",
+                (REVIEW, now, RUNNING, now - STALE_RUNNING_SECONDS * 1000),
+            )
+
+    def _run_job(self, job_id):
+        try:
+            row = self._connect().execute("SELECT payload, attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            payload = json.loads(zlib.decompress(row["payload"]).decode("utf-8"))
+            # The payload was built when the job was queued; stamp the real send time
+            payload["timestamp"] = str(datetime.now())
+            success, message, retry_safe = self.send(payload, self.endpoint_url)
+            self._finish(job_id, success, message, row["attempts"], retry_safe)
+        except Exception as e:
+            logger.exception("Falha ao enviar o agendamento %s", job_id)
+            self._finish(job_id, False, f"Erro: {e}", MAX_ATTEMPTS, False)
+        finally:
+            with self._running_lock:
+                self._running.discard(job_id)
+            self._wake.set()
+
+    def _finish(self, job_id, success, message, attempts, retry_safe):
+        now = _now_ms()
+        conn = self._connect()
+        with conn:
+            if success:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, finished_at = ?, message = ? WHERE id = ?",
+                    (DONE, now, message[:500], job_id),
+                )
+            elif retry_safe and attempts < MAX_ATTEMPTS:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, run_at = ?, message = ? WHERE id = ?",
+                    (PENDING, now + RETRY_DELAY_SECONDS * 1000, f"tentativa {attempts}: {message}"[:500], job_id),
+                )
+            else:
+                if not retry_safe:
+                    message = f"{message[:420]} (sem reenvio automático: pode ter chegado ao n8n)"
+                conn.execute(
+                    "UPDATE jobs SET status = ?, finished_at = ?, message = ? WHERE id = ?",
+                    (FAILED, now, message[:500], job_id),
+                )
@@ -0,0 +1,209 @@
+import os
+import time
+import shutil
+import logging
+import tempfile
+import threading
+
+import pandas as pd
+
+# Process-wide owner of the large per-session tables (e.g. the ads editor).
+# st.session_state only keeps a TableHandle; the DataFrame lives here so it
+# can be measured, spilled to Parquet when idle or over budget, and dropped
+# once the session goes away.
+MEMORY_BUDGET_BYTES = int(float(os.environ.get("SESSION_MEMORY_BUDGET_MB", "512")) * 1024 * 1024)
+SPILL_AFTER_IDLE_SECONDS = int(os.environ.get("SESSION_SPILL_AFTER_SECONDS", str(5 * 60)))
+EVICT_AFTER_IDLE_SECONDS = int(os.environ.get("SESSION_EVICT_AFTER_SECONDS", str(2 * 60 * 60)))
+MAINTENANCE_INTERVAL_SECONDS = 10
+
+logger = logging.getLogger(__name__)
+
+
+def dataframe_bytes(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+class _Entry:
+    __slots__ = ("df", "path", "nbytes", "disk_bytes", "last_access")
+
+    def __init__(self):
+        self.df = None
+        self.path = None
+        self.nbytes = 0
+        self.disk_bytes = 0
+        self.last_access = time.time()
+
+
+class TableHandle:
+    # Small, picklable reference stored in st.session_state
+    __slots__ = ("store", "session_id", "name")
+
+    def __init__(self, store, session_id, name):
+        self.store = store
+        self.session_id = session_id
+        self.name = name
+
+    def load(self, default=None):
+        df = self.store.get(self.session_id, self.name)
+        return default if df is None else df
+
+    def save(self, df):
+        self.store.put(self.session_id, self.name, df)
+
+
+class SessionStore:
+    def __init__(self, spill_dir=None, memory_budget=MEMORY_BUDGET_BYTES,
+                 spill_after=SPILL_AFTER_IDLE_SECONDS, evict_after=EVICT_AFTER_IDLE_SECONDS):
+        self.spill_dir = spill_dir or os.environ.get("SESSION_SPILL_DIR") or tempfile.mkdtemp(prefix="dash-sessions-")
+        os.makedirs(self.spill_dir, exist_ok=True)
+        self.memory_budget = memory_budget
+        self.spill_after = spill_after
+        self.evict_after = evict_after
+        self._sessions = {}
+        self._last_seen = {}
+        self._lock = threading.RLock()
+        self._last_maintenance = 0.0
+
+    def handle(self, session_id, name, default=None):
+        handle = TableHandle(self, session_id or "_anonymous", name)
+        if default is not None and self.get(handle.session_id, name) is None:
+            handle.save(default)
+        return handle
+
+    def touch(self, session_id):
+        if session_id:
+            with self._lock:
+                self._last_seen[session_id] = time.time()
+
+    def get(self, session_id, name):
+        with self._lock:
+            entry = self._sessions.get(session_id, {}).get(name)
+            if entry is None:
+                return None
+            entry.last_access = time.time()
+            self._last_seen[session_id] = entry.last_access
+            if entry.df is None and entry.path:
+                entry.df = self._read(entry.path)
+                entry.nbytes = dataframe_bytes(entry.df)
+            return entry.df
+
+    def put(self, session_id, name, df):
+        with self._lock:
+            entry = self._sessions.setdefault(session_id, {}).get(name)
+            if entry is None:
+                entry = self._sessions[session_id][name] = _Entry()
+            if entry.df is df:
+                entry.last_access = time.time()
+                return
+            # The on-disk copy is stale as soon as the table changes
+            self._remove_file(entry)
+            entry.df = df
+            entry.nbytes = dataframe_bytes(df)
+            entry.last_access = time.time()
+            self._last_seen[session_id] = entry.last_access
+
+    def drop_session(self, session_id):
+        with self._lock:
+            for entry in self._sessions.pop(session_id, {}).values():
+                self._remove_file(entry)
+            self._last_seen.pop(session_id, None)
+
+    # Run idle eviction, idle spilling and the memory budget. Cheap to call on
+    # every rerun; the real work happens at most once per interval unless the
+    # budget is exceeded.
+    def maintain(self, current_session_id=None, force=False):
+        now = time.time()
+        with self._lock:
+            over_budget = self.memory_bytes() > self.memory_budget
+            if not force and not over_budget and now - self._last_maintenance < MAINTENANCE_INTERVAL_SECONDS:
+                return
+            self._last_maintenance = now
+
+            for session_id, last_seen in list(self._last_seen.items()):
+                if session_id != current_session_id and now - last_seen > self.evict_after:
+                    self.drop_session(session_id)
+
+            for session_id, tables in self._sessions.items():
+                for name, entry in tables.items():
+                    if entry.df is not None and now - entry.last_access > self.spill_after:
+                        self._spill(session_id, name, entry)
+
+            # Spill least recently used tables until back under budget,
+            # leaving the session that is currently rendering for last
+            if self.memory_bytes() > self.memory_budget:
+                candidates = sorted(
+                    ((entry.last_access, session_id == current_session_id, session_id, name, entry)
+                     for session_id, tables in self._sessions.items()
+                     for name, entry in tables.items() if entry.df is not None),
+                    key=lambda item: (item[1], item[0]),
+                )
+                for _, _, session_id, name, entry in candidates:
+                    if self.memory_bytes() <= self.memory_budget:
+                        break
+                    self._spill(session_id, name, entry)
+
+    def memory_bytes(self):
+        with self._lock:
+            return sum(entry.nbytes for tables in self._sessions.values()
+                       for entry in tables.values() if entry.df is not None)
+
+    def footprint(self):
+        with self._lock:
+            rows = []
+            for session_id, tables in self._sessions.items():
+                rows.append({
+                    "session_id": session_id,
+                    "tables": len(tables),
+                    "memory_bytes": sum(e.nbytes for e in tables.values() if e.df is not None),
+                    "disk_bytes": sum(e.disk_bytes for e in tables.values() if e.path),
+                    "idle_seconds": time.time() - self._last_seen.get(session_id, time.time()),
+                })
+            return rows
+
+    def _spill(self, session_id, name, entry):
+        if entry.df is None:
+            return
+        if entry.path is None:
+            path = os.path.join(self.spill_dir, f"{session_id}-{name}")
+            try:
+                entry.path = self._write(entry.df, path)
+                entry.disk_bytes = os.path.getsize(entry.path)
+            except Exception:
+                logger.exception("Falha ao descarregar tabela %s da sessão %s", name, session_id)
+                entry.path = None
+                return
+        entry.df = None
+        entry.nbytes = 0
+
+    @staticmethod
+    def _write(df, path):
+        try:
+            df.to_parquet(path + ".parquet", index=True)
+            return path + ".parquet"
+        except Exception as e:
+            # Mixed-type object columns can't always be expressed in Arrow
+            logger.debug("Parquet indisponível (%s), usando pickle", e)
+            df.to_pickle(path + ".pkl")
+            return path + ".pkl"
+
+    @staticmethod
+    def _read(path):
+        if path.endswith(".parquet"):
+            return pd.read_parquet(path, memory_map=True)
+        return pd.read_pickle(path)
+
+    @staticmethod
+    def _remove_file(entry):
+        if entry.path:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+            entry.path = None
+            entry.disk_bytes = 0
+
+    def close(self):
+        with self._lock:
+            self._sessions.clear()
+            self._last_seen.clear()
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
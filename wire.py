@@ -0,0 +1,193 @@
+import os
+import gzip
+import json
+import logging
+from operator import itemgetter
+
+# Wire format of the webhook body. The default is the plain JSON payload. The
+# compact format ("compacto/1") turns the list in "dados" into a columnar
+# envelope, since ads batches repeat the same BM, account, CTA, status and
+# media on every record:
+#
+#   {"formato": "compacto/1", "tipo_requisicao": ..., "timestamp": ...,
+#    "total": <records>, "campos": [field order],
+#    "comuns": {field: value equal in every record},
+#    "colunas": {field: {"valores": [...]}                      plain
+#                       {"dicionario": [...], "indices": [...]}  few distinct values
+#                       {"prefixos": [...], "sufixos": [...]}}   front coding: length of the
+#                                                                prefix shared with the previous value + the rest
+#
+# Prefix lengths are in UTF-16 code units, like JavaScript string lengths, so
+# the n8n decoder can slice with String.prototype.slice (emoji in ad copy are
+# two units there and one character in Python).
+#
+# Bodies can also be compressed (Content-Encoding gzip or zstd). The reference
+# decoders are decode() below and n8n/decodificar_payload.js for the n8n side.
+#
+# WEBHOOK_FORMAT: json (default) | compacto
+# WEBHOOK_COMPRESSION: none (default) | gzip | zstd (needs the zstandard package)
+FORMAT = os.environ.get("WEBHOOK_FORMAT", "json")
+COMPRESSION = os.environ.get("WEBHOOK_COMPRESSION", "none")
+GZIP_LEVEL = int(os.environ.get("WEBHOOK_GZIP_LEVEL", "6"))
+ZSTD_LEVEL = int(os.environ.get("WEBHOOK_ZSTD_LEVEL", "3"))
+
+COMPACT_FORMAT = "compacto/1"
+# Dictionary-encode a column when it has at most this share of distinct values
+MAX_DICTIONARY_RATIO = 0.5
+# Front-code a text column when values share at least this many leading characters on average
+MIN_SHARED_PREFIX = 4
+
+logger = logging.getLogger(__name__)
+
+
+# Length of the common prefix, found by bisecting on slice comparisons
+def _shared_prefix(previous, value):
+    low, high = 0, min(len(previous), len(value))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if previous[:middle] == value[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def _utf16_len(text):
+    return len(text) if text.isascii() else len(text.encode("utf-16-le")) // 2
+
+
+def _utf16_slice(text, units):
+    return text[:units] if text.isascii() else text.encode("utf-16-le")[:2 * units].decode("utf-16-le")
+
+
+def _front_code(values):
+    prefixes = []
+    suffixes = []
+    previous = ""
+    for value in values:
+        size = _shared_prefix(previous, value)
+        prefixes.append(_utf16_len(value[:size]))
+        suffixes.append(value[size:])
+        previous = value
+    return prefixes, suffixes
+
+
+def _encode_column(values):
+    codes = {}
+    texts = all(type(value) is str for value in values)
+    # Lists (e.g. Imagens) are not hashable; their repr is, and it also keeps
+    # 1, 1.0, True and "1" apart
+    keys = values if texts else map(repr, values)
+    indices = [codes.setdefault(key, len(codes)) for key in keys]
+    if len(codes) == 1:
+        return None
+    if len(codes) <= MAX_DICTIONARY_RATIO * len(values):
+        distinct = [None] * len(codes)
+        for value, index in zip(values, indices):
+            distinct[index] = value
+        return {"dicionario": distinct, "indices": indices}
+    if texts:
+        prefixes, suffixes = _front_code(values)
+        if sum(prefixes) >= MIN_SHARED_PREFIX * len(values):
+            return {"prefixos": prefixes, "sufixos": suffixes}
+    return {"valores": values}
+
+
+# Columnar envelope of a payload whose "dados" is a list of records with the
+# same fields; anything else is returned unchanged
+def compact(payload):
+    records = payload.get("dados") if isinstance(payload, dict) else None
+    if not isinstance(records, list) or not records or not all(isinstance(record, dict) for record in records):
+        return payload
+    fields = list(records[0])
+    if any(record.keys() != records[0].keys() for record in records):
+        return payload
+    envelope = {"formato": COMPACT_FORMAT, **{key: value for key, value in payload.items() if key != "dados"}}
+    envelope.update({"total": len(records), "campos": fields, "comuns": {}, "colunas": {}})
+    rows = map(itemgetter(*fields), records) if len(fields) > 1 else ((record[fields[0]],) for record in records)
+    for field, values in zip(fields, map(list, zip(*rows))):
+        column = _encode_column(values)
+        if column is None:
+            envelope["comuns"][field] = values[0]
+        else:
+            envelope["colunas"][field] = column
+    return envelope
+
+
+def _decode_column(column):
+    if "valores" in column:
+        return column["valores"]
+    if "dicionario" in column:
+        distinct = column["dicionario"]
+        return [distinct[index] for index in column["indices"]]
+    values = []
+    previous = ""
+    for size, suffix in zip(column["prefixos"], column["sufixos"]):
+        previous = _utf16_slice(previous, size) + suffix
+        values.append(previous)
+    return values
+
+
+# Inverse of compact()
+def expand(envelope):
+    if not isinstance(envelope, dict) or envelope.get("formato") != COMPACT_FORMAT:
+        return envelope
+    total = envelope["total"]
+    columns = {field: _decode_column(column) for field, column in envelope["colunas"].items()}
+    common = envelope["comuns"]
+    records = [
+        {field: (columns[field][i] if field in columns else common[field]) for field in envelope["campos"]}
+        for i in range(total)
+    ]
+    payload = {key: value for key, value in envelope.items() if key not in ("formato", "total", "campos", "comuns", "colunas")}
+    return {"tipo_requisicao": payload.pop("tipo_requisicao", None), "dados": records, **payload}
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+# Request body and headers for a payload in the given (default: configured) format
+def encode(payload, wire_format=None, compression=None):
+    wire_format = wire_format or FORMAT
+    compression = compression or COMPRESSION
+    headers = {"Content-Type": "application/json"}
+    if wire_format == "compacto":
+        payload = compact(payload)
+        if isinstance(payload, dict) and payload.get("formato") == COMPACT_FORMAT:
+            headers["X-Payload-Format"] = COMPACT_FORMAT
+    body = json.dumps(payload, allow_nan=False, separators=(",", ":") if wire_format == "compacto" else None).encode("utf-8")
+
+    if compression == "zstd":
+        zstandard = _zstd()
+        if zstandard is None:
+            logger.warning("WEBHOOK_COMPRESSION=zstd sem o pacote zstandard; usando gzip")
+            compression = "gzip"
+        else:
+            body = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+            headers["Content-Encoding"] = "zstd"
+    if compression == "gzip":
+        # mtime=0: the same payload always gives the same bytes (and audit hash)
+        body = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+        headers["Content-Encoding"] = "gzip"
+    return body, headers
+
+
+# Reference decoder: request body (and headers) back to the original payload.
+# The compression is recognized by its magic bytes as well, in case a proxy
+# dropped or already applied Content-Encoding.
+def decode(body, headers=None):
+    headers = {key.lower(): value for key, value in (headers or {}).items()}
+    encoding = headers.get("content-encoding", "").lower()
+    if encoding == "gzip" or body[:2] == b"\x1f\x8b":
+        body = gzip.decompress(body)
+    elif encoding == "zstd" or body[:4] == b"\x28\xb5\x2f\xfd":
+        zstandard = _zstd()
+        if zstandard is None:
+            raise ValueError("corpo zstd recebido sem o pacote zstandard instalado")
+        body = zstandard.ZstdDecompressor().decompressobj().decompress(body)
+    return expand(json.loads(body))
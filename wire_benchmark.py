@@ -0,0 +1,143 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import argparse
+import subprocess
+from statistics import median
+from time import perf_counter
+
+# Benchmark submissions stay out of the real audit log
+os.environ.setdefault("AUDIT_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="dash-wire-benchmark-"), "audit.sqlite3"))
+
+import wire
+from core import build_ads_payload, send_to_webhook
+from loadtest import synthetic_ads
+from mock_webhook import MockConfig, MockWebhook
+
+# Bytes on the wire and end-to-end send latency of an ads batch in each wire
+# format (see wire.py), through the real send_to_webhook path against the
+# local mock with a simulated uplink:
+#   python wire_benchmark.py --rows 1000,10000 --bandwidth-mbps 20
+# Before measuring, every format is checked to round-trip through wire.decode
+# and, when node is installed, through n8n/decodificar_payload.js.
+FORMATS = [
+    ("json", "none"),
+    ("json", "gzip"),
+    ("compacto", "none"),
+    ("compacto", "gzip"),
+    ("compacto", "zstd"),
+]
+IMAGE_LINK = "https://drive.google.com/file/d/exemplo/view"
+N8N_DECODER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "n8n", "decodificar_payload.js")
+
+# Runs the Code-node script on a raw body (stdin) the way n8n does, with the
+# body as the Webhook node's binary "data", and prints the decoded payload
+N8N_HARNESS = """
+const fs = require('fs');
+const raw = fs.readFileSync(0);
+const source = fs.readFileSync(process.argv[1], 'utf8');
+const AsyncFunction = Object.getPrototypeOf(async function () {}).constructor;
+const node = new AsyncFunction('$input', 'require', source);
+const items = [{ json: { headers: {}, body: {} }, binary: { data: {} } }];
+node.call({ helpers: { getBinaryDataBuffer: async () => raw } }, { all: () => items }, require)
+  .then((out) => process.stdout.write(JSON.stringify(out[0].json.body)));
+"""
+
+
+# Batch whose front-coded columns carry accents and characters outside the
+# BMP (emoji are one character in Python and two UTF-16 units in JavaScript)
+def sample_payload(rows=40):
+    ads = synthetic_ads(rows)
+    ads["Nome Anúncio"] = [f"🔥 Promoção {i} dias 🚀" if i % 3 else f"🔥 Promo {i} dias" for i in range(rows)]
+    ads["Link de Destino"] = [f"https://exemplo.com.br/ofertas/😀/{i}?utm=ação" for i in range(rows)]
+    return build_ads_payload(ads, IMAGE_LINK, "")
+
+
+def check_round_trip(payload):
+    node = shutil.which("node")
+    for wire_format, compression in FORMATS:
+        if compression == "zstd" and wire._zstd() is None:
+            continue
+        body, headers = wire.encode(payload, wire_format, compression)
+        if wire.decode(body, headers) != payload:
+            raise RuntimeError(f"{wire_format}+{compression}: wire.decode difere do original")
+        if node and compression != "zstd":
+            result = subprocess.run([node, "-e", N8N_HARNESS, N8N_DECODER], input=body, capture_output=True, check=True)
+            if json.loads(result.stdout) != payload:
+                raise RuntimeError(f"{wire_format}+{compression}: decodificar_payload.js difere do original")
+    return node is not None
+
+
+def measure(payload, wire_format, compression, url, repeats):
+    encode_times = []
+    decode_times = []
+    for _ in range(repeats):
+        start = perf_counter()
+        body, headers = wire.encode(payload, wire_format, compression)
+        encode_times.append(perf_counter() - start)
+        start = perf_counter()
+        if wire.decode(body, headers) != payload:
+            raise RuntimeError(f"{wire_format}+{compression}: o payload decodificado difere do original")
+        decode_times.append(perf_counter() - start)
+
+    # send_to_webhook reads the configured format
+    wire.FORMAT, wire.COMPRESSION = wire_format, compression
+    send_times = []
+    for _ in range(repeats):
+        start = perf_counter()
+        success, message = send_to_webhook(payload, url)
+        send_times.append(perf_counter() - start)
+        if not success:
+            raise RuntimeError(message)
+    return {
+        "formato": wire_format,
+        "compressao": headers.get("Content-Encoding", "none"),
+        "bytes": len(body),
+        "encode_ms": median(encode_times) * 1000,
+        "decode_ms": median(decode_times) * 1000,
+        "envio_ms": median(send_times) * 1000,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tamanho e latência do envio em cada formato de transporte")
+    parser.add_argument("--rows", default="1000,10000", help="Linhas por lote, separadas por vírgula")
+    parser.add_argument("--bandwidth-mbps", type=float, default=20.0, help="Upload simulado até o webhook (0: sem limite)")
+    parser.add_argument("--repeats", type=int, default=3, help="Repetições por medida (mediana)")
+    parser.add_argument("--json", action="store_true", help="Imprime os resultados em JSON")
+    args = parser.parse_args(argv)
+
+    checked_n8n = check_round_trip(sample_payload())
+    print("Ida e volta ok (wire.decode" + (" e decodificar_payload.js)" if checked_n8n else "; node ausente, JS não verificado)"), file=sys.stderr)
+
+    server = MockWebhook(MockConfig(bandwidth_mbps=args.bandwidth_mbps)).start_in_thread()
+    results = []
+    try:
+        for rows in [int(value) for value in args.rows.split(",") if value.strip()]:
+            payload = build_ads_payload(synthetic_ads(rows), IMAGE_LINK, "")
+            for wire_format, compression in FORMATS:
+                if compression == "zstd" and wire._zstd() is None:
+                    continue
+                result = measure(payload, wire_format, compression, server.url, args.repeats)
+                results.append({"linhas": rows, **result})
+    finally:
+        server.stop()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    print(f"Upload simulado: {args.bandwidth_mbps:g} Mbit/s" if args.bandwidth_mbps else "Upload sem limite")
+    print(f"{'linhas':>7} {'formato':<9} {'compressão':<10} {'bytes':>10} {'razão':>7} {'encode ms':>10} {'decode ms':>10} {'envio ms':>9}")
+    for result in results:
+        baseline = next(r for r in results if r["linhas"] == result["linhas"] and r["formato"] == "json" and r["compressao"] == "none")
+        print(
+            f"{result['linhas']:>7} {result['formato']:<9} {result['compressao']:<10} {result['bytes']:>10} "
+            f"{baseline['bytes'] / result['bytes']:>6.1f}x {result['encode_ms']:>10.1f} {result['decode_ms']:>10.1f} {result['envio_ms']:>9.1f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
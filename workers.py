@@ -0,0 +1,109 @@
+import os
+import sys
+import atexit
+import importlib
+import threading
+import multiprocessing
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+
+# Process pool for CPU-heavy work on big tables (row validation, copy lint).
+# Streamlit runs every session as a thread of one interpreter, so without it
+# one 100k-row validation holds the GIL for all of them.
+#
+# VALIDATION_PROCESSES sets the pool size; 0 (default) keeps everything in
+# the calling thread. Workers are spawned, not forked: the Streamlit process
+# has threads (autosave timers, the session store) that a fork would copy in
+# an arbitrary state.
+VALIDATION_PROCESSES = int(os.environ.get("VALIDATION_PROCESSES", "0"))
+# Chunks submitted ahead of the one being consumed, per call
+PREFETCH_PER_PROCESS = 2
+
+_pool = None
+_pool_lock = threading.Lock()
+_spawn_lock = threading.Lock()
+
+
+def enabled():
+    return VALIDATION_PROCESSES > 0
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=VALIDATION_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+            atexit.register(shutdown)
+        return _pool
+
+
+# Streamlit runs app.py as the __main__ module, and a spawned process
+# re-imports __main__ from its __file__ before running anything: every worker
+# would execute the whole page. Workers only need core, so they are started
+# with __main__ looking like an interactive session (no file to re-run).
+@contextmanager
+def _no_main_file():
+    main = sys.modules.get("__main__")
+    path = getattr(main, "__file__", None)
+    if path is not None:
+        del main.__file__
+    try:
+        yield
+    finally:
+        if path is not None:
+            main.__file__ = path
+
+
+# submit() starts a worker whenever none is idle, so every submit is covered
+def _submit(pool, func, *args):
+    with _spawn_lock, _no_main_file():
+        return pool.submit(func, *args)
+
+
+def _import(module):
+    importlib.import_module(module)
+
+
+# Start the workers and import module in each, in the background, so the
+# first big validation doesn't pay for spawning and importing pandas
+def warm_up(module):
+    if enabled():
+        pool = get_pool()
+        for _ in range(VALIDATION_PROCESSES):
+            _submit(pool, _import, module)
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+# Apply func to every chunk, yielding (chunk, result) in input order. With the
+# pool on, at most processes * PREFETCH_PER_PROCESS chunks are in flight, so a
+# streamed file is still read lazily and memory stays bounded. func must be a
+# function of an importable module (it is pickled by name; not __main__).
+def map_chunks(func, chunks):
+    if not enabled():
+        for chunk in chunks:
+            yield chunk, func(chunk)
+        return
+
+    pool = get_pool()
+    pending = deque()
+    try:
+        for chunk in chunks:
+            pending.append((chunk, _submit(pool, func, chunk)))
+            if len(pending) >= VALIDATION_PROCESSES * PREFETCH_PER_PROCESS:
+                chunk, future = pending.popleft()
+                yield chunk, future.result()
+        while pending:
+            chunk, future = pending.popleft()
+            yield chunk, future.result()
+    finally:
+        # Consumer stopped early (cancel, rerun): drop what has not started
+        for _, future in pending:
+            future.cancel()